@@ -20,6 +20,7 @@ import sys
 from pathlib import Path
 from datetime import datetime
 from typing import Dict, Any, Optional
+import orjson
 
 # 導入我們的驗證器
 from data_validator import DataValidator, ValidationStatus
@@ -45,8 +46,7 @@ class CompanyManager:
         holdings_file = self.data_dir / "holdings.json"
         
         if holdings_file.exists():
-            with open(holdings_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            return orjson.loads(holdings_file.read_bytes())
         return {}
     
     def save_holdings(self, holdings: Dict[str, Any]) -> None:
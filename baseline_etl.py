@@ -269,8 +269,8 @@ class BaselineETL:
         """儲存基準數據"""
         output_file = self.data_dir / "historical_baseline.json"
         
-        with open(output_file, 'w') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+        with open(output_file, 'wb') as f:
+            f.write(json.dumps(data, indent=2, separators=(',', ': '), ensure_ascii=False).encode('utf-8'))
         
         logger.info(f"Baseline data saved to {output_file}")
         logger.info(f"Processed {len(data['data'])} weeks of baseline data")
@@ -286,8 +286,8 @@ class BaselineETL:
         }
         
         summary_file = self.data_dir / "baseline_summary.json"
-        with open(summary_file, 'w') as f:
-            json.dump(summary, f, indent=2, ensure_ascii=False)
+        with open(summary_file, 'wb') as f:
+            f.write(json.dumps(summary, indent=2, separators=(',', ': '), ensure_ascii=False).encode('utf-8'))
     
     def run(self) -> None:
         """執行基準數據 ETL 流程"""
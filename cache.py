@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+Simple on-disk JSON cache for market data lookups
+Closing prices for past trading days never change, so they can be kept indefinitely
+"""
+
+import time
+from pathlib import Path
+from typing import Any, Optional
+
+import orjson
+
+CACHE_DIR = Path(__file__).parent / ".cache"
+
+class FileCache:
+    def __init__(self, namespace: str, ttl: Optional[float] = None):
+        self.cache_dir = CACHE_DIR / namespace
+        self.ttl = ttl  # Seconds before an entry expires; None keeps entries forever
+    
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key.replace('/', '_')}.json"
+    
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value for key, or None if it is missing or expired"""
+        try:
+            entry = orjson.loads(self._path(key).read_bytes())
+        except (OSError, orjson.JSONDecodeError):
+            return None
+        
+        if self.ttl is not None and time.time() - entry['timestamp'] > self.ttl:
+            return None
+        
+        return entry['data']
+    
+    def set(self, key: str, value: Any) -> None:
+        """Store value under key"""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._path(key).write_bytes(orjson.dumps({"timestamp": time.time(), "data": value}))
@@ -123,9 +123,9 @@ def convert_weekly_to_historical():
             "companies": prev_companies
         }
     
-    # Write historical data
-    with open(historical_file, 'w') as f:
-        json.dump(historical_data, f, indent=2, ensure_ascii=False)
+    # Write historical data (compact, like the other baseline writers)
+    with open(historical_file, 'wb') as f:
+        f.write(json.dumps(historical_data, separators=(',', ':'), ensure_ascii=False).encode('utf-8'))
     
     print(f"Converted data written to {historical_file}")
     print(f"Generated {len(historical_data['data'])} weeks of data")
@@ -260,8 +260,9 @@ class HistoricalDataCollector:
         """保存歷史數據"""
         output_file = "public/data/complete_historical_baseline.json"
         
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        # 一次序列化後整份寫入；與其他基準數據寫入程式一致採用緊湊格式
+        with open(output_file, 'wb') as f:
+            f.write(json.dumps(data, separators=(',', ':'), ensure_ascii=False).encode('utf-8'))
         
         logger.info(f"Historical data saved to {output_file}")
         
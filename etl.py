@@ -9,11 +9,12 @@ Data Sources:
 - Static holdings.json for company crypto holdings
 """
 
-import json
 import os
 import logging
 from datetime import datetime, timedelta
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple
+import numpy as np
+import orjson
 import requests
 import yfinance as yf
 from pathlib import Path
@@ -26,6 +27,12 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+def write_json_atomic(path: Path, payload: Any, indent: bool = False) -> None:
+    """Write JSON to a temp file beside path, then atomically swap it into place"""
+    tmp_file = path.with_suffix(path.suffix + '.tmp')
+    tmp_file.write_bytes(orjson.dumps(payload, option=orjson.OPT_INDENT_2 if indent else 0))
+    os.replace(tmp_file, path)
+
 class CryptoStockETL:
     def __init__(self):
         self.base_dir = Path(__file__).parent
@@ -43,6 +50,11 @@ class CryptoStockETL:
         self.rate_limit_delay = 8  # seconds between API calls (7.5 calls/minute)  
         self.max_retries = 3  # Reduced retries for faster execution
         self.backoff_multiplier = 1.5  # Smaller backoff multiplier
+        self._holdings_cache: Optional[Tuple[int, Dict[str, Any]]] = None  # (st_mtime_ns, holdings)
+        
+        # One keep-alive connection pool shared by every Yahoo Finance and CoinGecko call
+        self.session = requests.Session()
+        self.session.headers.update(self.request_headers)
         
         # Time zone configuration
         self.us_eastern = pytz.timezone('US/Eastern')
@@ -64,11 +76,12 @@ class CryptoStockETL:
             datetime(last_friday.year, last_friday.month, last_friday.day, 16, 0, 0)
         )
         
-        # Convert to Taiwan time for logging
-        market_close_tw = market_close_et.astimezone(self.taiwan_tz)
-        
-        logger.info(f"Using market close time: {market_close_tw.strftime('%Y-%m-%d %H:%M:%S %Z')} "
-                   f"(ET: {market_close_et.strftime('%Y-%m-%d %H:%M:%S %Z')})")
+        if logger.isEnabledFor(logging.INFO):
+            # Convert to Taiwan time for logging
+            market_close_tw = market_close_et.astimezone(self.taiwan_tz)
+            logger.info("Using market close time: %s (ET: %s)",
+                        market_close_tw.strftime('%Y-%m-%d %H:%M:%S %Z'),
+                        market_close_et.strftime('%Y-%m-%d %H:%M:%S %Z'))
         
         return market_close_et
         
@@ -105,12 +118,17 @@ class CryptoStockETL:
                 }
             }
             
-            with open(holdings_file, 'w') as f:
-                json.dump(default_holdings, f, indent=2)
-            logger.info(f"Created default holdings file: {holdings_file}")
+            holdings_file.write_bytes(orjson.dumps(default_holdings, option=orjson.OPT_INDENT_2))
+            logger.info("Created default holdings file: %s", holdings_file)
             
-        with open(holdings_file, 'r') as f:
-            return json.load(f)
+        # Only re-parse when the file changed since the last call
+        mtime_ns = holdings_file.stat().st_mtime_ns
+        if self._holdings_cache and self._holdings_cache[0] == mtime_ns:
+            return self._holdings_cache[1]
+        
+        holdings = orjson.loads(holdings_file.read_bytes())
+        self._holdings_cache = (mtime_ns, holdings)
+        return holdings
     
     def fetch_stock_data(self, ticker: str, target_date: datetime = None) -> Optional[Dict[str, Any]]:
         """Fetch stock data from Yahoo Finance for a specific date (defaults to last Friday close)"""
@@ -118,7 +136,7 @@ class CryptoStockETL:
             if target_date is None:
                 target_date = self.get_last_friday_close()
             
-            stock = yf.Ticker(ticker)
+            stock = yf.Ticker(ticker, session=self.session)
             
             # Get data for the target date and some previous days for comparison
             start_date = target_date - timedelta(days=10)  # Get 10 days of data to ensure we have enough
@@ -127,63 +145,96 @@ class CryptoStockETL:
             hist = stock.history(start=start_date, end=end_date)
             
             if hist.empty:
-                logger.warning(f"No stock data found for {ticker}")
-                return None
-            
-            # Convert target_date to market timezone for comparison
-            target_date_et = target_date.astimezone(self.us_eastern).date()
-            
-            # Find the close price for the target date
-            target_close = None
-            target_date_str = None
-            
-            # Look for exact date match first
-            for date, row in hist.iterrows():
-                market_date = date.date()
-                if market_date == target_date_et:
-                    target_close = float(row['Close'])
-                    target_date_str = market_date.strftime('%Y-%m-%d')
-                    break
-            
-            # If no exact match, find the closest previous trading day
-            if target_close is None:
-                for date, row in reversed(list(hist.iterrows())):
-                    market_date = date.date()
-                    if market_date <= target_date_et:
-                        target_close = float(row['Close'])
-                        target_date_str = market_date.strftime('%Y-%m-%d')
-                        logger.info(f"{ticker}: Using closest trading day {target_date_str} instead of target {target_date_et}")
-                        break
-            
-            if target_close is None:
-                logger.warning(f"No stock price found for {ticker} around {target_date_et}")
+                logger.warning("No stock data found for %s", ticker)
                 return None
             
-            # Get previous close for percentage calculation
-            hist_list = list(hist.iterrows())
-            previous_close = target_close  # Default fallback
-            
-            for i, (date, row) in enumerate(hist_list):
-                if date.date().strftime('%Y-%m-%d') == target_date_str and i > 0:
-                    previous_close = float(hist_list[i-1][1]['Close'])
-                    break
-            
-            # Calculate percentage change
-            pct_change = ((target_close - previous_close) / previous_close) * 100 if previous_close != 0 and previous_close != target_close else 0
-            
-            logger.info(f"{ticker} stock price on {target_date_str}: ${target_close:.2f} (change: {pct_change:+.2f}%)")
-            
-            return {
-                "ticker": ticker,
-                "close": target_close,
-                "pct_change": pct_change,
-                "date": target_date_str,
-                "timestamp": target_date.isoformat()
-            }
+            return self.stock_record_from_closes(ticker, hist['Close'], target_date)
             
         except Exception as e:
-            logger.error(f"Error fetching stock data for {ticker}: {e}")
+            logger.error("Error fetching stock data for %s: %s", ticker, e)
+            return None
+    
+    def fetch_stock_data_batch(self, tickers: List[str], target_date: datetime = None) -> Dict[str, Dict[str, Any]]:
+        """Fetch stock data for many tickers with a single Yahoo Finance download"""
+        if target_date is None:
+            target_date = self.get_last_friday_close()
+        
+        start_date = target_date - timedelta(days=10)
+        end_date = target_date + timedelta(days=1)
+        
+        try:
+            # auto_adjust matches the Ticker.history() default used by fetch_stock_data
+            df = yf.download(
+                tickers,
+                start=start_date,
+                end=end_date,
+                group_by='ticker',
+                auto_adjust=True,
+                threads=True,
+                progress=False,
+                session=self.session
+            )
+        except Exception as e:
+            logger.error("Batch stock download failed: %s", e)
+            return {}
+        
+        results = {}
+        
+        for ticker in tickers:
+            try:
+                # A single-ticker download comes back without the ticker column level
+                closes = df[ticker]['Close'] if df.columns.nlevels > 1 else df['Close']
+            except KeyError:
+                continue
+            
+            record = self.stock_record_from_closes(ticker, closes.dropna(), target_date)
+            if record:
+                results[ticker] = record
+        
+        return results
+    
+    def stock_record_from_closes(self, ticker: str, closes, target_date: datetime) -> Optional[Dict[str, Any]]:
+        """Build the stock record for target_date from a series of daily closes"""
+        if closes.empty:
+            logger.warning("No stock data found for %s", ticker)
             return None
+        
+        # Pull closes into a float64 buffer once instead of iterating rows
+        dates = closes.index.date
+        closes = closes.to_numpy(dtype=np.float64)
+        
+        # Convert target_date to market timezone for comparison
+        target_date_et = target_date.astimezone(self.us_eastern).date()
+        
+        # Find the target date, or the closest previous trading day
+        pos = int(np.searchsorted(dates, target_date_et, side='right')) - 1
+        
+        if pos < 0:
+            logger.warning("No stock price found for %s around %s", ticker, target_date_et)
+            return None
+        
+        market_date = dates[pos]
+        target_close = float(closes[pos])
+        target_date_str = market_date.strftime('%Y-%m-%d')
+        
+        if market_date != target_date_et:
+            logger.info("%s: Using closest trading day %s instead of target %s", ticker, target_date_str, target_date_et)
+        
+        # Get previous close for percentage calculation
+        previous_close = float(closes[pos - 1]) if pos > 0 else target_close
+        
+        # Calculate percentage change
+        pct_change = ((target_close - previous_close) / previous_close) * 100 if previous_close != 0 and previous_close != target_close else 0
+        
+        logger.info("%s stock price on %s: $%.2f (change: %+.2f%%)", ticker, target_date_str, target_close, pct_change)
+        
+        return {
+            "ticker": ticker,
+            "close": target_close,
+            "pct_change": pct_change,
+            "date": target_date_str,
+            "timestamp": target_date.isoformat()
+        }
     
     def fetch_crypto_data(self, coin_id: str, target_date: datetime = None) -> Optional[Dict[str, Any]]:
         """Fetch cryptocurrency data from CoinGecko for a specific date (defaults to last Friday close)"""
@@ -210,26 +261,26 @@ class CryptoStockETL:
                     'localization': 'false'
                 }
                 
-                response = requests.get(url, params=params, headers=self.request_headers, timeout=30)
+                response = self.session.get(url, params=params, timeout=30)
                 
                 if response.status_code == 429:  # Rate limited
                     wait_time = self.rate_limit_delay * (self.backoff_multiplier ** attempt)
-                    logger.warning(f"Rate limited for {coin_id}, waiting {wait_time}s (attempt {attempt+1}/{self.max_retries})")
+                    logger.warning("Rate limited for %s, waiting %ss (attempt %d/%d)", coin_id, wait_time, attempt + 1, self.max_retries)
                     time.sleep(wait_time)
                     continue
                 
                 response.raise_for_status()
-                data = response.json()
+                data = orjson.loads(response.content)
                 
                 if not data or 'market_data' not in data:
-                    logger.warning(f"No historical crypto data found for {coin_id} on {date_str}")
+                    logger.warning("No historical crypto data found for %s on %s", coin_id, date_str)
                     return None
                 
                 market_data = data['market_data']
                 current_price = market_data.get('current_price', {}).get('usd', 0)
                 
                 if current_price == 0:
-                    logger.warning(f"No USD price found for {coin_id} on {date_str}")
+                    logger.warning("No USD price found for %s on %s", coin_id, date_str)
                     return None
                 
                 # Try to get previous day's data for percentage calculation
@@ -239,16 +290,15 @@ class CryptoStockETL:
                 # Small delay before second API call
                 time.sleep(self.rate_limit_delay)
                 
-                prev_response = requests.get(
+                prev_response = self.session.get(
                     f"{self.coingecko_base_url}/coins/{coin_id}/history",
                     params={'date': prev_date_str, 'localization': 'false'},
-                    headers=self.request_headers, 
                     timeout=30
                 )
                 
                 previous_price = current_price  # Fallback
                 if prev_response.status_code == 200:
-                    prev_data = prev_response.json()
+                    prev_data = orjson.loads(prev_response.content)
                     if prev_data and 'market_data' in prev_data:
                         previous_price = prev_data['market_data'].get('current_price', {}).get('usd', current_price)
                 
@@ -265,40 +315,40 @@ class CryptoStockETL:
                     "volume": market_data.get('total_volume', {}).get('usd', 0)
                 }
                 
-                logger.info(f"Successfully fetched crypto data for {coin_id} on {date_str}: ${current_price:.2f} (change: {pct_change:+.2f}%)")
+                logger.info("Successfully fetched crypto data for %s on %s: $%.2f (change: %+.2f%%)", coin_id, date_str, current_price, pct_change)
                 return result
                 
             except requests.exceptions.HTTPError as e:
                 if e.response.status_code == 429:  # Rate limit
                     wait_time = self.rate_limit_delay * (self.backoff_multiplier ** attempt)
-                    logger.warning(f"Rate limit hit for {coin_id}, waiting {wait_time}s (attempt {attempt + 1}/{self.max_retries})")
+                    logger.warning("Rate limit hit for %s, waiting %ss (attempt %d/%d)", coin_id, wait_time, attempt + 1, self.max_retries)
                     time.sleep(wait_time)
                     continue
                 else:
-                    logger.error(f"HTTP error fetching crypto data for {coin_id}: {e}")
+                    logger.error("HTTP error fetching crypto data for %s: %s", coin_id, e)
                     if attempt < self.max_retries - 1:
                         wait_time = self.rate_limit_delay * (self.backoff_multiplier ** attempt)
-                        logger.info(f"Retrying in {wait_time}s...")
+                        logger.info("Retrying in %ss...", wait_time)
                         time.sleep(wait_time)
                         continue
                     return None
             except requests.exceptions.RequestException as e:
-                logger.error(f"Request error fetching crypto data for {coin_id}: {e}")
+                logger.error("Request error fetching crypto data for %s: %s", coin_id, e)
                 if attempt < self.max_retries - 1:
                     wait_time = self.rate_limit_delay * (self.backoff_multiplier ** attempt)
-                    logger.info(f"Retrying in {wait_time}s...")
+                    logger.info("Retrying in %ss...", wait_time)
                     time.sleep(wait_time)
                     continue
                 return None
             except Exception as e:
-                logger.error(f"Unexpected error fetching crypto data for {coin_id}: {e}")
+                logger.error("Unexpected error fetching crypto data for %s: %s", coin_id, e)
                 if attempt < self.max_retries - 1:
                     wait_time = 5  # Short wait for unexpected errors
                     time.sleep(wait_time)
                     continue
                 return None
         
-        logger.error(f"Failed to fetch crypto data for {coin_id} after {self.max_retries} attempts")
+        logger.error("Failed to fetch crypto data for %s after %d attempts", coin_id, self.max_retries)
         return None
     
     def get_crypto_supply(self, coin_id: str) -> Optional[float]:
@@ -311,7 +361,7 @@ class CryptoStockETL:
         }
         
         if coin_id in supply_fallbacks:
-            logger.info(f"Using fallback supply value for {coin_id}: {supply_fallbacks[coin_id]}")
+            logger.info("Using fallback supply value for %s: %s", coin_id, supply_fallbacks[coin_id])
             return supply_fallbacks[coin_id]
         
         try:
@@ -319,20 +369,20 @@ class CryptoStockETL:
             time.sleep(self.rate_limit_delay)  # Rate limit this call too
             
             url = f"{self.coingecko_base_url}/coins/{coin_id}"
-            response = requests.get(url, headers=self.request_headers, timeout=30)
+            response = self.session.get(url, timeout=30)
             
             if response.status_code == 429:  # Rate limited
-                logger.warning(f"Rate limited fetching supply for {coin_id}, using fallback")
+                logger.warning("Rate limited fetching supply for %s, using fallback", coin_id)
                 return supply_fallbacks.get(coin_id, 1000000.0)  # Generic fallback
             
             response.raise_for_status()
-            data = response.json()
+            data = orjson.loads(response.content)
             circulating_supply = data.get('market_data', {}).get('circulating_supply')
             
             return float(circulating_supply) if circulating_supply else supply_fallbacks.get(coin_id, 1000000.0)
             
         except Exception as e:
-            logger.warning(f"Error fetching supply data for {coin_id}: {e}, using fallback")
+            logger.warning("Error fetching supply data for %s: %s, using fallback", coin_id, e)
             return supply_fallbacks.get(coin_id, 1000000.0)
     
     def calculate_holding_percentage(self, holding_qty: float, coin_id: str) -> float:
@@ -353,15 +403,15 @@ class CryptoStockETL:
         processed_data = []
         crypto_cache = {}  # Cache crypto data to avoid duplicate API calls
         
-        logger.info(f"Processing synchronized data for {len(holdings)} companies using target date: {week_end}")
+        logger.info("Processing synchronized data for %d companies using target date: %s", len(holdings), week_end)
         
         for ticker, holding_info in holdings.items():
-            logger.info(f"Processing {ticker} for {week_end}...")
+            logger.info("Processing %s for %s...", ticker, week_end)
             
             # Fetch stock data for the target date
             stock_data = self.fetch_stock_data(ticker, target_date)
             if not stock_data:
-                logger.warning(f"Skipping {ticker} due to missing stock data")
+                logger.warning("Skipping %s due to missing stock data", ticker)
                 continue
             
             # Fetch crypto data for the same target date (use cache if available)
@@ -371,7 +421,7 @@ class CryptoStockETL:
                 if crypto_data:
                     crypto_cache[coin_id] = crypto_data
                 else:
-                    logger.warning(f"Skipping {ticker} due to missing crypto data")
+                    logger.warning("Skipping %s due to missing crypto data", ticker)
                     continue
             
             crypto_data = crypto_cache[coin_id]
@@ -410,40 +460,43 @@ class CryptoStockETL:
     
     def save_data(self, data: Dict[str, Any]) -> None:
         """Save processed data to JSON files and update historical baseline"""
-        # Save weekly stats
+        # Save weekly stats (replaced before the summary so it never points at stale data)
         output_file = self.data_dir / "weekly_stats.json"
-        with open(output_file, 'w') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+        write_json_atomic(output_file, data)
+        
+        logger.info("Data saved to %s", output_file)
+        logger.info("Processed %d companies", len(data['data']))
+        
+        # Create a summary file for quick access
+        # Written before the baseline update so consumers see the new week right away
+        summary = {
+            "last_updated": data["generated_at"],
+            "companies_count": len(data['data']),
+            "week_end": data["week_end"]
+        }
         
-        logger.info(f"Data saved to {output_file}")
-        logger.info(f"Processed {len(data['data'])} companies")
+        summary_file = self.data_dir / "summary.json"
+        write_json_atomic(summary_file, summary)
         
-        # Update historical baseline with incremental ETL
+        self.update_historical_baseline()
+    
+    def update_historical_baseline(self) -> None:
+        """Update historical baseline with incremental ETL, falling back to convert_data.py"""
         try:
             from incremental_etl import IncrementalETL
             incremental_etl = IncrementalETL()
             incremental_etl.ensure_current_week_exists()
             logger.info("Historical baseline updated via incremental ETL")
         except Exception as e:
-            logger.warning(f"Could not update historical baseline: {e}")
+            logger.warning("Could not update historical baseline: %s", e)
             # Fallback to convert_data.py for backward compatibility
             try:
                 import subprocess
-                subprocess.run(['python', 'convert_data.py'], check=True, cwd=str(self.base_dir))
+                import sys
+                subprocess.run([sys.executable, 'convert_data.py'], check=True, cwd=str(self.base_dir))
                 logger.info("Historical baseline updated via convert_data.py fallback")
             except Exception as fallback_error:
-                logger.error(f"Both incremental ETL and fallback failed: {fallback_error}")
-        
-        # Create a summary file for quick access
-        summary = {
-            "last_updated": data["generated_at"],
-            "companies_count": len(data['data']),
-            "week_end": data["week_end"]
-        }
-        
-        summary_file = self.data_dir / "summary.json"
-        with open(summary_file, 'w') as f:
-            json.dump(summary, f, indent=2)
+                logger.error("Both incremental ETL and fallback failed: %s", fallback_error)
     
     def run(self) -> None:
         """Execute the full ETL pipeline"""
@@ -462,7 +515,7 @@ class CryptoStockETL:
                     "data": []
                 }
             else:
-                logger.info(f"Successfully processed {len(weekly_data['data'])} companies")
+                logger.info("Successfully processed %d companies", len(weekly_data['data']))
             
             # Save results
             self.save_data(weekly_data)
@@ -470,7 +523,7 @@ class CryptoStockETL:
             logger.info("ETL pipeline completed successfully!")
             
         except Exception as e:
-            logger.error(f"ETL pipeline failed: {e}")
+            logger.error("ETL pipeline failed: %s", e)
             # Try to create a minimal data file so the build doesn't completely fail
             try:
                 fallback_data = {
@@ -480,11 +533,10 @@ class CryptoStockETL:
                     "error": str(e)
                 }
                 output_file = self.data_dir / "weekly_stats.json"
-                with open(output_file, 'w') as f:
-                    json.dump(fallback_data, f, indent=2, ensure_ascii=False)
-                logger.info(f"Created fallback data file at {output_file}")
+                write_json_atomic(output_file, fallback_data)
+                logger.info("Created fallback data file at %s", output_file)
             except Exception as save_error:
-                logger.error(f"Failed to create fallback data: {save_error}")
+                logger.error("Failed to create fallback data: %s", save_error)
             raise
 
 def main():
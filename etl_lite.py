@@ -4,16 +4,22 @@ Lightweight ETL Pipeline for GitHub Actions
 Optimized for speed and reliability in CI environments
 """
 
-import json
 import os
 import logging
 from datetime import datetime, timedelta
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple
+import orjson
 import requests
-import yfinance as yf
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from pathlib import Path
-import pytz
+from zoneinfo import ZoneInfo
 import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property
+from cache import FileCache
 
 # Configure logging
 logging.basicConfig(
@@ -30,17 +36,33 @@ class CryptoStockETLLite:
         
         # API Configuration
         self.coingecko_base_url = "https://api.coingecko.com/api/v3"
+        self.yahoo_chart_url = "https://query1.finance.yahoo.com/v8/finance/chart"
         self.request_headers = {
             'User-Agent': 'crypto-stock-tracker/1.0 (https://github.com/user/crypto-stock-tracker)'
         }
         
         # Aggressive settings for CI
-        self.rate_limit_delay = 6  # 10 calls per minute
+        self.calls_per_minute = 10  # CoinGecko free tier
         self.max_retries = 2
+        self.stock_workers = 8  # Concurrent Yahoo Finance requests
+        
+        # Reuse one keep-alive connection pool for all CoinGecko and Yahoo chart calls
+        self.session = requests.Session()
+        self.session.headers.update(self.request_headers)
+        adapter = HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=8,
+            max_retries=Retry(total=self.max_retries, backoff_factor=0.5)
+        )
+        self.session.mount('https://', adapter)
+        self._coingecko_lock = threading.Lock()
+        self._coingecko_calls = deque(maxlen=self.calls_per_minute)  # Start times of recent calls
+        self._etag_cache = FileCache("coingecko_etag")  # Last ETag and body per request, for conditional GETs
+        self._holdings_cache: Optional[Tuple[int, Dict[str, Any]]] = None  # (st_mtime_ns, holdings)
         
         # Time zone configuration
-        self.us_eastern = pytz.timezone('US/Eastern')
-        self.taiwan_tz = pytz.timezone('Asia/Taipei')
+        self.us_eastern = ZoneInfo('US/Eastern')
+        self.taiwan_tz = ZoneInfo('Asia/Taipei')
         
         # Hardcoded supply values to avoid API calls
         self.crypto_supplies = {
@@ -62,7 +84,12 @@ class CryptoStockETLLite:
             'the-open-network': 6.5,
         }
     
-    def get_last_friday_close(self) -> datetime:
+    @cached_property
+    def target_date(self) -> datetime:
+        """Last Friday's market close, computed once so every step of a run agrees on it"""
+        return self._compute_last_friday_close()
+    
+    def _compute_last_friday_close(self) -> datetime:
         """Get the last Friday's market close time"""
         now = datetime.now(self.taiwan_tz)
         days_since_friday = (now.weekday() - 4) % 7
@@ -70,11 +97,12 @@ class CryptoStockETLLite:
             days_since_friday = 7
             
         last_friday = now - timedelta(days=days_since_friday)
-        market_close_et = self.us_eastern.localize(
-            datetime(last_friday.year, last_friday.month, last_friday.day, 16, 0, 0)
+        market_close_et = datetime(
+            last_friday.year, last_friday.month, last_friday.day, 16, 0, 0, tzinfo=self.us_eastern
         )
         
-        logger.info(f"Using market close time: {market_close_et.strftime('%Y-%m-%d %H:%M:%S %Z')}")
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("Using market close time: %s", market_close_et.strftime('%Y-%m-%d %H:%M:%S %Z'))
         return market_close_et
         
     def load_holdings(self) -> Dict[str, Any]:
@@ -82,42 +110,68 @@ class CryptoStockETLLite:
         holdings_file = self.data_dir / "holdings.json"
         
         if not holdings_file.exists():
-            logger.error(f"Holdings file not found: {holdings_file}")
+            logger.error("Holdings file not found: %s", holdings_file)
             return {}
-            
-        with open(holdings_file, 'r') as f:
-            return json.load(f)
+        
+        # Only re-parse when the file changed since the last call
+        mtime_ns = holdings_file.stat().st_mtime_ns
+        if self._holdings_cache and self._holdings_cache[0] == mtime_ns:
+            return self._holdings_cache[1]
+        
+        holdings = orjson.loads(holdings_file.read_bytes())
+        self._holdings_cache = (mtime_ns, holdings)
+        return holdings
     
     def fetch_stock_data(self, ticker: str, target_date: datetime = None) -> Optional[Dict[str, Any]]:
-        """Fetch stock data from Yahoo Finance"""
+        """Fetch stock data from Yahoo Finance's chart endpoint over the shared session"""
         try:
             if target_date is None:
-                target_date = self.get_last_friday_close()
+                target_date = self.target_date
             
-            stock = yf.Ticker(ticker)
             start_date = target_date - timedelta(days=10)
             end_date = target_date + timedelta(days=1)
             
-            hist = stock.history(start=start_date, end=end_date)
+            # The chart JSON carries just the daily closes we need, without yfinance's per-call overhead
+            url = f"{self.yahoo_chart_url}/{ticker}"
+            params = {
+                'period1': int(start_date.timestamp()),
+                'period2': int(end_date.timestamp()),
+                'interval': '1d'
+            }
             
-            if hist.empty:
-                logger.warning(f"No stock data found for {ticker}")
+            response = self.session.get(url, params=params, timeout=10)
+            response.raise_for_status()
+            
+            result = (orjson.loads(response.content)['chart']['result'] or [None])[0]
+            if not result or not result.get('timestamp'):
+                logger.warning("No stock data found for %s", ticker)
                 return None
             
-            # Find the most recent price
-            latest_row = hist.iloc[-1]
-            target_close = float(latest_row['Close'])
+            # Adjusted closes match the auto_adjust=True batch download
+            indicators = result['indicators']
+            adjclose = indicators.get('adjclose')
+            closes = adjclose[0]['adjclose'] if adjclose else indicators['quote'][0]['close']
+            exchange_tz = ZoneInfo(result['meta'].get('exchangeTimezoneName', 'America/New_York'))
+            
+            # Skip days Yahoo reports without a close
+            valid = [(ts, close) for ts, close in zip(result['timestamp'], closes) if close is not None]
+            if not valid:
+                logger.warning("No stock data found for %s", ticker)
+                return None
+            
+            last_ts, target_close = valid[-1]
+            target_close = float(target_close)
             
             # Calculate percentage change
-            if len(hist) > 1:
-                prev_close = float(hist.iloc[-2]['Close'])
+            if len(valid) > 1:
+                prev_close = float(valid[-2][1])
                 pct_change = ((target_close - prev_close) / prev_close) * 100
             else:
                 pct_change = 0
             
-            target_date_str = hist.index[-1].strftime('%Y-%m-%d')
+            target_date_str = datetime.fromtimestamp(last_ts, exchange_tz).strftime('%Y-%m-%d')
             
-            logger.info(f"{ticker} stock price: ${target_close:.2f} (change: {pct_change:+.2f}%)")
+            logger.info("%s stock price: $%.2f (change: %+.2f%%)", ticker, target_close, pct_change)
             
             return {
                 "ticker": ticker,
@@ -128,62 +182,151 @@ class CryptoStockETLLite:
             }
             
         except Exception as e:
-            logger.error(f"Error fetching stock data for {ticker}: {e}")
+            logger.error("Error fetching stock data for %s: %s", ticker, e)
             return None
     
-    def fetch_crypto_data_simple(self, coin_id: str, target_date: datetime = None) -> Optional[Dict[str, Any]]:
-        """Fetch crypto data with aggressive fallback strategy"""
+    def fetch_stock_data_batch(self, tickers: List[str], target_date: datetime = None) -> Dict[str, Dict[str, Any]]:
+        """Fetch stock data for all tickers with a single Yahoo Finance download"""
+        if target_date is None:
+            target_date = self.target_date
+        
+        start_date = target_date - timedelta(days=10)
+        end_date = target_date + timedelta(days=1)
+        
+        # Imported here so importing this module does not pull in yfinance and pandas
+        import yfinance as yf
+        
+        try:
+            # auto_adjust matches the Ticker.history() default used by fetch_stock_data
+            df = yf.download(
+                tickers,
+                start=start_date,
+                end=end_date,
+                group_by='ticker',
+                auto_adjust=True,
+                threads=True,
+                progress=False
+            )
+        except Exception as e:
+            logger.error("Batch stock download failed: %s", e)
+            return {}
+        
+        results = {}
+        
+        for ticker in tickers:
+            try:
+                # A single-ticker download comes back without the ticker column level
+                closes = df[ticker]['Close'] if df.columns.nlevels > 1 else df['Close']
+                closes = closes.dropna()
+            except KeyError:
+                continue
+            
+            if closes.empty:
+                continue
+            
+            target_close = float(closes.iloc[-1])
+            
+            # Calculate percentage change
+            if len(closes) > 1:
+                prev_close = float(closes.iloc[-2])
+                pct_change = ((target_close - prev_close) / prev_close) * 100
+            else:
+                pct_change = 0
+            
+            logger.info("%s stock price: $%.2f (change: %+.2f%%)", ticker, target_close, pct_change)
+            
+            results[ticker] = {
+                "ticker": ticker,
+                "close": target_close,
+                "pct_change": pct_change,
+                "date": closes.index[-1].strftime('%Y-%m-%d'),
+                "timestamp": target_date.isoformat()
+            }
+        
+        return results
+    
+    def wait_for_coingecko(self) -> None:
+        """Block only when another CoinGecko call would exceed the per-minute limit"""
+        with self._coingecko_lock:
+            if len(self._coingecko_calls) == self._coingecko_calls.maxlen:
+                wait = 60 - (time.monotonic() - self._coingecko_calls[0])
+                if wait > 0:
+                    time.sleep(wait)
+            
+            self._coingecko_calls.append(time.monotonic())
+    
+    def fetch_all_crypto(self, coin_ids: List[str], target_date: datetime = None) -> Dict[str, Dict[str, Any]]:
+        """Fetch crypto data for all coins in a single API call, falling back per coin"""
         if target_date is None:
-            target_date = self.get_last_friday_close()
+            target_date = self.target_date
+        
+        prices = {}
         
         # Try API first, but with tight timeout
         try:
-            time.sleep(self.rate_limit_delay)
+            self.wait_for_coingecko()
             
-            # Use simple price endpoint instead of historical
+            # Use simple price endpoint instead of historical; it accepts many ids at once
             url = f"{self.coingecko_base_url}/simple/price"
             params = {
-                'ids': coin_id,
+                'ids': ','.join(coin_ids),
                 'vs_currencies': 'usd',
                 'include_24hr_change': 'true'
             }
             
-            response = requests.get(url, params=params, headers=self.request_headers, timeout=10)
+            # Ask CoinGecko to skip the body if nothing changed since the last run
+            etag_key = params['ids']
+            cached = self._etag_cache.get(etag_key)
+            headers = {'If-None-Match': cached['etag']} if cached else {}
+            
+            response = self.session.get(url, params=params, headers=headers, timeout=10)
             
             if response.status_code == 200:
-                data = response.json()
-                if coin_id in data:
-                    price = data[coin_id]['usd']
-                    change = data[coin_id].get('usd_24h_change', 0)
-                    
-                    logger.info(f"Fetched {coin_id} current price: ${price:.2f} (24h: {change:+.2f}%)")
-                    
-                    return {
-                        "coin_id": coin_id,
-                        "close": price,
-                        "pct_change": change,
-                        "date": target_date.strftime('%Y-%m-%d'),
-                        "timestamp": target_date.isoformat(),
-                        "market_cap": 0,  # Skip this for speed
-                        "volume": 0       # Skip this for speed
-                    }
+                prices = orjson.loads(response.content)
+                etag = response.headers.get('ETag')
+                if etag:
+                    self._etag_cache.set(etag_key, {"etag": etag, "body": prices})
+            elif response.status_code == 304 and cached:
+                logger.info("Prices unchanged for %s, reusing cached response", ', '.join(coin_ids))
+                prices = cached['body']
+            else:
+                logger.warning("API returned %s for %s, using fallback", response.status_code, ', '.join(coin_ids))
         
-        except Exception as e:
-            logger.warning(f"API failed for {coin_id}: {e}, using fallback")
+        except requests.Timeout:
+            logger.warning("API timed out for %s, using fallback", ', '.join(coin_ids))
+        except (requests.RequestException, orjson.JSONDecodeError) as e:
+            logger.warning("API failed for %s: %s, using fallback", ', '.join(coin_ids), e)
         
-        # Use fallback prices
-        fallback_price = self.crypto_fallback_prices.get(coin_id, 100.0)
-        logger.info(f"Using fallback price for {coin_id}: ${fallback_price:.2f}")
+        results = {}
         
-        return {
-            "coin_id": coin_id,
-            "close": fallback_price,
-            "pct_change": 0,  # No change data available
-            "date": target_date.strftime('%Y-%m-%d'),
-            "timestamp": target_date.isoformat(),
-            "market_cap": 0,
-            "volume": 0
-        }
+        for coin_id in coin_ids:
+            quote = prices.get(coin_id) or {}
+            
+            if 'usd' in quote:
+                price = quote['usd']
+                change = quote.get('usd_24h_change', 0)
+                logger.info("Fetched %s current price: $%.2f (24h: %+.2f%%)", coin_id, price, change)
+            else:
+                # Use fallback prices
+                price = self.crypto_fallback_prices.get(coin_id, 100.0)
+                change = 0  # No change data available
+                logger.info("Using fallback price for %s: $%.2f", coin_id, price)
+            
+            results[coin_id] = {
+                "coin_id": coin_id,
+                "close": price,
+                "pct_change": change,
+                "date": target_date.strftime('%Y-%m-%d'),
+                "timestamp": target_date.isoformat(),
+                "market_cap": 0,  # Skip this for speed
+                "volume": 0       # Skip this for speed
+            }
+        
+        return results
+    
+    def fetch_crypto_data_simple(self, coin_id: str, target_date: datetime = None) -> Optional[Dict[str, Any]]:
+        """Fetch crypto data with aggressive fallback strategy"""
+        return self.fetch_all_crypto([coin_id], target_date)[coin_id]
     
     def process_weekly_data(self) -> Dict[str, Any]:
         """Main ETL process with simplified logic"""
@@ -193,57 +336,80 @@ class CryptoStockETLLite:
             logger.error("No holdings data found")
             return {"week_end": "", "generated_at": datetime.now().isoformat(), "data": []}
         
-        target_date = self.get_last_friday_close()
+        target_date = self.target_date
         week_end = target_date.strftime('%Y-%m-%d')
         
-        processed_data = []
-        crypto_cache = {}
+        rows = []
         
-        logger.info(f"Processing {len(holdings)} companies using target date: {week_end}")
+        logger.info("Processing %d companies using target date: %s", len(holdings), week_end)
         
-        for ticker, holding_info in holdings.items():
-            logger.info(f"Processing {ticker}...")
+        coin_ids = sorted({holding_info['coin_id'] for holding_info in holdings.values()})
+        
+        # Yahoo and CoinGecko are independent, so fetch every coin in one request while the stocks download
+        with ThreadPoolExecutor(max_workers=self.stock_workers + 1) as executor:
+            crypto_future = executor.submit(self.fetch_all_crypto, coin_ids, target_date)
+            
+            # Fetch all stock histories in one batched download
+            stock_results = self.fetch_stock_data_batch(list(holdings), target_date)
             
-            # Fetch stock data
-            stock_data = self.fetch_stock_data(ticker, target_date)
+            # Retry anything the batch missed individually, in parallel
+            missing_tickers = [ticker for ticker in holdings if ticker not in stock_results]
+            if missing_tickers:
+                logger.warning("Batch download missed %s, fetching individually", ', '.join(missing_tickers))
+                stock_futures = {
+                    ticker: executor.submit(self.fetch_stock_data, ticker, target_date)
+                    for ticker in missing_tickers
+                }
+                for ticker, future in stock_futures.items():
+                    stock_results[ticker] = future.result()
+            
+            crypto_cache = crypto_future.result()
+        
+        for ticker, holding_info in holdings.items():
+            stock_data = stock_results[ticker]
             if not stock_data:
-                logger.warning(f"Skipping {ticker} due to missing stock data")
+                logger.warning("Skipping %s due to missing stock data", ticker)
                 continue
             
-            # Fetch or use cached crypto data
             coin_id = holding_info['coin_id']
-            if coin_id not in crypto_cache:
-                crypto_data = self.fetch_crypto_data_simple(coin_id, target_date)
-                if crypto_data:
-                    crypto_cache[coin_id] = crypto_data
-                else:
-                    logger.warning(f"Skipping {ticker} due to missing crypto data")
-                    continue
-            
-            crypto_data = crypto_cache[coin_id]
-            
-            # Calculate holding percentage using hardcoded supply
-            supply = self.crypto_supplies.get(coin_id, 1000000.0)
-            holding_pct = (holding_info['holding_qty'] / supply) * 100
+            crypto_data = crypto_cache.get(coin_id)
+            if not crypto_data:
+                logger.warning("Skipping %s due to missing crypto data", ticker)
+                continue
             
-            # Combine data
-            combined_data = {
+            # Collect raw values; rounding happens once for the whole table below
+            rows.append({
                 "ticker": ticker,
                 "company_name": holding_info['company_name'],
-                "stock_close": round(stock_data['close'], 2),
-                "stock_pct_change": round(stock_data['pct_change'], 2),
+                "stock_close": stock_data['close'],
+                "stock_pct_change": stock_data['pct_change'],
                 "coin": holding_info['coin'],
-                "coin_close": round(crypto_data['close'], 2),
-                "coin_pct_change": round(crypto_data['pct_change'], 2),
+                "coin_close": crypto_data['close'],
+                "coin_pct_change": crypto_data['pct_change'],
                 "holding_qty": holding_info['holding_qty'],
-                "holding_pct_of_supply": round(holding_pct, 4),
+                "supply": self.crypto_supplies.get(coin_id, 1000000.0),  # Hardcoded supply
                 "market_cap": crypto_data.get('market_cap', 0)
-            }
-            
-            processed_data.append(combined_data)
+            })
+        
+        processed_data = []
+        
+        if rows:
+            import pandas as pd
             
-            # Brief pause between companies
-            time.sleep(1)
+            # Combine data
+            df = pd.DataFrame(rows)
+            df.insert(
+                df.columns.get_loc('supply'),
+                'holding_pct_of_supply',
+                (df['holding_qty'] / df['supply'] * 100).round(4)
+            )
+            df = df.drop(columns='supply').round({
+                'stock_close': 2,
+                'stock_pct_change': 2,
+                'coin_close': 2,
+                'coin_pct_change': 2
+            })
+            processed_data = df.to_dict('records')
         
         return {
             "week_end": week_end,
@@ -255,11 +421,10 @@ class CryptoStockETLLite:
         """Save processed data to JSON files"""
         # Save weekly stats
         output_file = self.data_dir / "weekly_stats.json"
-        with open(output_file, 'w') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+        output_file.write_bytes(orjson.dumps(data))
         
-        logger.info(f"Data saved to {output_file}")
-        logger.info(f"Processed {len(data['data'])} companies")
+        logger.info("Data saved to %s", output_file)
+        logger.info("Processed %d companies", len(data['data']))
         
         # Create summary file
         summary = {
@@ -269,12 +434,12 @@ class CryptoStockETLLite:
         }
         
         summary_file = self.data_dir / "summary.json"
-        with open(summary_file, 'w') as f:
-            json.dump(summary, f, indent=2)
+        summary_file.write_bytes(orjson.dumps(summary))
     
     def run(self) -> None:
         """Execute the lightweight ETL pipeline"""
         logger.info("Starting Lightweight Crypto-Stock ETL pipeline...")
+        week_end = self.target_date.strftime('%Y-%m-%d')
         
         try:
             # Process data
@@ -283,7 +448,7 @@ class CryptoStockETLLite:
             if not weekly_data.get('data'):
                 logger.warning("No data was successfully processed!")
                 weekly_data = {
-                    "week_end": self.get_last_friday_close().strftime('%Y-%m-%d'),
+                    "week_end": week_end,
                     "generated_at": datetime.now().isoformat(),
                     "data": []
                 }
@@ -294,22 +459,23 @@ class CryptoStockETLLite:
             logger.info("Lightweight ETL pipeline completed successfully!")
             
         except Exception as e:
-            logger.error(f"ETL pipeline failed: {e}")
+            logger.error("ETL pipeline failed: %s", e)
             # Create fallback data
             try:
                 fallback_data = {
-                    "week_end": self.get_last_friday_close().strftime('%Y-%m-%d'),
+                    "week_end": week_end,
                     "generated_at": datetime.now().isoformat(),
                     "data": [],
                     "error": str(e)
                 }
                 output_file = self.data_dir / "weekly_stats.json"
-                with open(output_file, 'w') as f:
-                    json.dump(fallback_data, f, indent=2, ensure_ascii=False)
-                logger.info(f"Created fallback data file")
+                output_file.write_bytes(orjson.dumps(fallback_data))
+                logger.info("Created fallback data file")
             except Exception as save_error:
-                logger.error(f"Failed to create fallback data: {save_error}")
+                logger.error("Failed to create fallback data: %s", save_error)
             raise
+        finally:
+            self.session.close()
 
 def main():
     """Main entry point"""
@@ -4,16 +4,155 @@ Generate REAL historical data using actual market prices
 Replaces the fake data generation with authentic historical market data
 """
 
-import json
 import logging
-from datetime import datetime, timedelta
+import time
+from bisect import bisect_left
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+import orjson
+import requests
 from etl import CryptoStockETL
+from cache import FileCache
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+def fetch_stock_closes(ticker: str, fridays: List[datetime]) -> Dict[str, Dict[str, Any]]:
+    """Fetch one history window covering all Fridays and pick each Friday's close"""
+    import yfinance as yf
+    
+    try:
+        hist = yf.Ticker(ticker).history(
+            start=min(fridays) - timedelta(days=10),
+            end=max(fridays) + timedelta(days=1)
+        )
+    except Exception as e:
+        logger.error("  Error fetching stock history for %s: %s", ticker, e)
+        return {}
+    
+    if hist.empty:
+        return {}
+    
+    closes = hist['Close']
+    results = {}
+    
+    # Closest trading day on or before each Friday close
+    for friday, pos in zip(fridays, hist.index.get_indexer(fridays, method='pad')):
+        if pos < 0:
+            continue
+        
+        close = float(closes.iloc[pos])
+        previous_close = float(closes.iloc[pos - 1]) if pos > 0 else close
+        pct_change = ((close - previous_close) / previous_close) * 100 if previous_close != 0 and previous_close != close else 0
+        
+        results[friday.strftime('%Y-%m-%d')] = {
+            "ticker": ticker,
+            "close": close,
+            "pct_change": pct_change,
+            "date": hist.index[pos].strftime('%Y-%m-%d'),
+            "timestamp": friday.isoformat()
+        }
+    
+    return results
+
+def fetch_crypto_closes(etl: CryptoStockETL, coin_id: str, fridays: List[datetime]) -> Dict[str, Dict[str, Any]]:
+    """Fetch one market_chart/range window covering all Fridays and pick each Friday's price"""
+    start = min(fridays) - timedelta(days=2)
+    end = max(fridays) + timedelta(days=1)
+    url = f"{etl.coingecko_base_url}/coins/{coin_id}/market_chart/range"
+    params = {'vs_currency': 'usd', 'from': int(start.timestamp()), 'to': int(end.timestamp())}
+    
+    chart = None
+    for attempt in range(etl.max_retries):
+        time.sleep(etl.rate_limit_delay)
+        try:
+            response = requests.get(url, params=params, headers=etl.request_headers, timeout=30)
+            if response.status_code == 429:
+                logger.warning("  Rate limited fetching %s range (attempt %d/%d)", coin_id, attempt + 1, etl.max_retries)
+                continue
+            response.raise_for_status()
+            chart = orjson.loads(response.content)
+            break
+        except requests.RequestException as e:
+            logger.warning("  Error fetching %s range (attempt %d/%d): %s", coin_id, attempt + 1, etl.max_retries, e)
+    
+    if not chart or not chart.get('prices'):
+        return {}
+    
+    prices = chart['prices']
+    timestamps = [point[0] for point in prices]
+    market_caps = dict(map(tuple, chart.get('market_caps', [])))
+    volumes = dict(map(tuple, chart.get('total_volumes', [])))
+    
+    def point_at(target_ms: float) -> Optional[List[float]]:
+        # Nearest sample, as long as it is within an hour of the target
+        i = bisect_left(timestamps, target_ms)
+        candidates = [prices[j] for j in (i - 1, i) if 0 <= j < len(prices)]
+        if not candidates:
+            return None
+        point = min(candidates, key=lambda p: abs(p[0] - target_ms))
+        return point if abs(point[0] - target_ms) <= 3600 * 1000 else None
+    
+    results = {}
+    
+    for friday in fridays:
+        # Match /coins/{id}/history, which reports the price at 00:00 UTC on the given date
+        target_ms = datetime(friday.year, friday.month, friday.day, tzinfo=timezone.utc).timestamp() * 1000
+        point = point_at(target_ms)
+        if point is None:
+            continue
+        
+        current_price = point[1]
+        previous_point = point_at(target_ms - 86400 * 1000)
+        previous_price = previous_point[1] if previous_point else current_price
+        pct_change = ((current_price - previous_price) / previous_price) * 100 if previous_price != 0 and previous_price != current_price else 0
+        
+        results[friday.strftime('%Y-%m-%d')] = {
+            "coin_id": coin_id,
+            "close": current_price,
+            "pct_change": pct_change,
+            "date": friday.strftime('%Y-%m-%d'),
+            "timestamp": friday.isoformat(),
+            "market_cap": market_caps.get(point[0], 0),
+            "volume": volumes.get(point[0], 0)
+        }
+    
+    return results
+
+def collect_closes(cache: FileCache, name: str, fridays: List[datetime], last_friday: datetime,
+                   fetch_window: Callable, fetch_single: Callable) -> Dict[str, Dict[str, Any]]:
+    """Serve closed Fridays from the cache, fetch the rest in one window, and fall back per Friday"""
+    results = {}
+    missing = []
+    
+    for friday in fridays:
+        friday_str = friday.strftime('%Y-%m-%d')
+        # Only the current week can still change
+        cached = cache.get(f"{name}_{friday_str}") if friday < last_friday else None
+        if cached is not None:
+            results[friday_str] = cached
+        else:
+            missing.append(friday)
+    
+    if not missing:
+        return results
+    
+    fetched = fetch_window(missing)
+    
+    for friday in missing:
+        friday_str = friday.strftime('%Y-%m-%d')
+        record = fetched.get(friday_str) or fetch_single(friday)
+        if not record:
+            continue
+        
+        results[friday_str] = record
+        if friday < last_friday:
+            cache.set(f"{name}_{friday_str}", record)
+    
+    return results
+
 def generate_real_historical_data():
     """Generate real historical data using actual market prices for the past 5 weeks"""
     
@@ -34,13 +173,17 @@ def generate_real_historical_data():
     # Sort so oldest is first
     target_fridays.sort()
     
-    logger.info(f"Collecting real historical data for {len(target_fridays)} weeks:")
+    logger.info("Collecting real historical data for %d weeks:", len(target_fridays))
     for friday in target_fridays:
-        logger.info(f"  - {friday.strftime('%Y-%m-%d %A')}")
+        logger.info("  - %s", friday.strftime('%Y-%m-%d %A'))
     
     # Load holdings configuration
     holdings = etl.load_holdings()
     
+    # Past Fridays are closed and never change, so their prices are cached on disk
+    stock_cache = FileCache("stock_close")
+    crypto_cache = FileCache("crypto_close")
+    
     historical_data = {
         "generated_at": datetime.now().isoformat(),
         "timezone": "Asia/Taipei",
@@ -49,29 +192,44 @@ def generate_real_historical_data():
         "data": {}
     }
     
-    # Collect real data for each Friday
+    # Fetch each ticker and coin once for the whole window, then pick the Friday closes locally
+    stock_closes = {}
+    for ticker in holdings:
+        logger.info("Fetching %s stock history...", ticker)
+        stock_closes[ticker] = collect_closes(
+            stock_cache, ticker, target_fridays, last_friday,
+            lambda fridays: fetch_stock_closes(ticker, fridays),
+            lambda friday: etl.fetch_stock_data(ticker, friday)
+        )
+    
+    crypto_closes = {}
+    for coin_id in {holding_info['coin_id'] for holding_info in holdings.values()}:
+        logger.info("Fetching %s price history...", coin_id)
+        crypto_closes[coin_id] = collect_closes(
+            crypto_cache, coin_id, target_fridays, last_friday,
+            lambda fridays: fetch_crypto_closes(etl, coin_id, fridays),
+            lambda friday: etl.fetch_crypto_data(coin_id, friday)
+        )
+    
+    # Assemble the data for each Friday
     for friday in target_fridays:
         year, week, _ = friday.isocalendar()
         week_key = f"{year}-W{week:02d}"
+        friday_str = friday.strftime('%Y-%m-%d')
         
-        logger.info(f"\nCollecting data for {week_key} ({friday.strftime('%Y-%m-%d')})...")
+        logger.info("\nCollecting data for %s (%s)...", week_key, friday_str)
         
         companies = {}
         
-        # Get real stock and crypto prices for this specific Friday
         for ticker, holding_info in holdings.items():
-            logger.info(f"  Processing {ticker}...")
-            
-            # Get stock price for this specific Friday
-            stock_data = etl.fetch_stock_data(ticker, friday)
+            stock_data = stock_closes[ticker].get(friday_str)
             if not stock_data:
-                logger.warning(f"  Failed to get stock data for {ticker}")
+                logger.warning("  Failed to get stock data for %s", ticker)
                 continue
             
-            # Get crypto price for this specific Friday  
-            crypto_data = etl.fetch_crypto_data(holding_info['coin_id'], friday)
+            crypto_data = crypto_closes[holding_info['coin_id']].get(friday_str)
             if not crypto_data:
-                logger.warning(f"  Failed to get crypto data for {holding_info['coin_id']}")
+                logger.warning("  Failed to get crypto data for %s", holding_info['coin_id'])
                 continue
             
             companies[ticker] = {
@@ -83,7 +241,7 @@ def generate_real_historical_data():
                 "coin_id": holding_info['coin_id']
             }
             
-            logger.info(f"    {ticker}: ${stock_data['close']:.2f}, {holding_info['coin']}: ${crypto_data['close']:.2f}")
+            logger.info("    %s: $%.2f, %s: $%.2f", ticker, stock_data['close'], holding_info['coin'], crypto_data['close'])
         
         # Only add week if we got data for all companies
         if len(companies) == len(holdings):
@@ -92,17 +250,16 @@ def generate_real_historical_data():
                 "week_start": f"{friday.strftime('%Y-%m-%d')}T16:00:00-04:00",  # Market close time
                 "companies": companies
             }
-            logger.info(f"  ✅ Successfully collected data for {week_key}")
+            logger.info("  ✅ Successfully collected data for %s", week_key)
         else:
-            logger.warning(f"  ❌ Incomplete data for {week_key}, skipping")
+            logger.warning("  ❌ Incomplete data for %s, skipping", week_key)
     
     # Save the real historical data
     output_file = data_dir / "complete_historical_baseline.json"
-    with open(output_file, 'w') as f:
-        json.dump(historical_data, f, indent=2, ensure_ascii=False)
+    output_file.write_bytes(orjson.dumps(historical_data))
     
-    logger.info(f"\n🎉 Real historical data saved to {output_file}")
-    logger.info(f"Generated {len(historical_data['data'])} weeks of REAL market data")
+    logger.info("\n🎉 Real historical data saved to %s", output_file)
+    logger.info("Generated %d weeks of REAL market data", len(historical_data['data']))
     
     # Show a summary
     print("\n" + "="*60)
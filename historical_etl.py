@@ -4,15 +4,21 @@ Historical Data ETL Pipeline for Crypto-Stock Tracker
 Fetches historical stock and crypto data for the past 2 months on Monday 8:00 AM UTC+8 baseline
 """
 
-import json
 import os
 import logging
 from datetime import datetime, timedelta
 from typing import Dict, List, Any, Optional
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
 import yfinance as yf
 from pathlib import Path
 import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from cache import FileCache
 
 # Configure logging
 logging.basicConfig(
@@ -21,6 +27,11 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@lru_cache(maxsize=512)
+def _cached_stock_history(stock: yf.Ticker, start: str, end: str):
+    """Daily history for a ticker between two ISO dates, memoized for the life of the process"""
+    return stock.history(start=start, end=end)
+
 class HistoricalETL:
     def __init__(self):
         self.base_dir = Path(__file__).parent
@@ -34,15 +45,34 @@ class HistoricalETL:
         }
         
         # Rate limiting - more conservative for historical data
-        self.rate_limit_delay = 8.0  # seconds between API calls
+        self.calls_per_minute = 25  # Stay under the CoinGecko free tier cap
         self.max_retries = 3
+        self.stock_workers = 8  # Concurrent Yahoo Finance requests
+        self.crypto_workers = 4  # Concurrent CoinGecko requests, still bounded by calls_per_minute
+        self._coingecko_lock = threading.Lock()
+        self._coingecko_calls = deque(maxlen=self.calls_per_minute)  # Start times of recent calls
+        
+        # Past prices never change; set HISTORICAL_NO_CACHE=1 to force a refresh
+        self.use_cache = os.environ.get('HISTORICAL_NO_CACHE') != '1'
+        self.crypto_history_cache = FileCache("coingecko_history")
+        
+        # Reuse one keep-alive connection pool for all CoinGecko calls; retries are handled per request
+        self.session = requests.Session()
+        self.session.headers.update(self.request_headers)
+        self.session.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=0))
+        
+        # Stamped once per collection run and shared by every record it produces
+        self._run_started_at: Optional[str] = None
+        
+        # One yf.Ticker per symbol, sharing the session, so setup happens once rather than every week
+        self._yf_tickers: Dict[str, yf.Ticker] = {}
+        self._yf_lock = threading.Lock()
         
     def load_holdings(self) -> Dict[str, Any]:
         """Load company crypto holdings configuration"""
         holdings_file = self.data_dir / "holdings.json"
         
-        with open(holdings_file, 'r') as f:
-            return json.load(f)
+        return orjson.loads(holdings_file.read_bytes())
     
     def get_past_mondays(self, weeks_back: int = 8) -> List[datetime]:
         """Get list of past Monday dates for baseline collection"""
@@ -67,15 +97,27 @@ class HistoricalETL:
         
         return sorted(mondays)
     
+    def run_timestamp(self) -> str:
+        """Timestamp for fetched records: the collection run's start time, or now outside a run"""
+        return self._run_started_at or datetime.now().isoformat()
+    
+    def get_yf_ticker(self, ticker: str) -> yf.Ticker:
+        """Return the shared yf.Ticker for a symbol"""
+        with self._yf_lock:
+            if ticker not in self._yf_tickers:
+                self._yf_tickers[ticker] = yf.Ticker(ticker, session=self.session)
+            return self._yf_tickers[ticker]
+    
     def fetch_historical_stock_data(self, ticker: str, start_date: datetime, end_date: datetime) -> Optional[Dict[str, Any]]:
         """Fetch historical stock data for a specific date range"""
         try:
-            stock = yf.Ticker(ticker)
+            history = _cached_stock_history if self.use_cache else _cached_stock_history.__wrapped__
             
             # Get historical data
-            hist = stock.history(
-                start=start_date.strftime('%Y-%m-%d'),
-                end=(end_date + timedelta(days=1)).strftime('%Y-%m-%d')
+            hist = history(
+                self.get_yf_ticker(ticker),
+                start_date.strftime('%Y-%m-%d'),
+                (end_date + timedelta(days=1)).strftime('%Y-%m-%d')
             )
             
             if hist.empty:
@@ -100,13 +142,61 @@ class HistoricalETL:
                 "close": float(target_data['Close']),
                 "pct_change": pct_change,
                 "date": start_date.strftime('%Y-%m-%d'),
-                "timestamp": datetime.now().isoformat()
+                "timestamp": self.run_timestamp()
             }
             
         except Exception as e:
             logger.error(f"Error fetching historical stock data for {ticker}: {e}")
             return None
     
+    def fetch_bulk_stock_history(self, tickers: List[str], start_date: datetime, end_date: datetime):
+        """Download daily history for all tickers in a single Yahoo Finance request"""
+        try:
+            # auto_adjust matches the Ticker.history() default used by fetch_historical_stock_data
+            return yf.download(
+                tickers,
+                start=start_date.strftime('%Y-%m-%d'),
+                end=(end_date + timedelta(days=1)).strftime('%Y-%m-%d'),
+                group_by='ticker',
+                auto_adjust=True,
+                threads=True,
+                progress=False
+            )
+        except Exception as e:
+            logger.error(f"Bulk stock download failed: {e}")
+            return None
+    
+    def pick_stock_close(self, history, ticker: str, date: datetime) -> Optional[Dict[str, Any]]:
+        """Pick the closest trading-day close on or before date from a bulk download"""
+        if history is None or history.empty:
+            return None
+        
+        try:
+            # A single-ticker download comes back without the ticker column level
+            closes = history[ticker]['Close'] if history.columns.nlevels > 1 else history['Close']
+        except KeyError:
+            return None
+        
+        closes = closes.dropna().loc[:date.strftime('%Y-%m-%d')]
+        if closes.empty:
+            return None
+        
+        close = float(closes.iloc[-1])
+        
+        # Calculate percentage change from the previous trading day if available
+        pct_change = 0
+        if len(closes) > 1:
+            prev_close = float(closes.iloc[-2])
+            pct_change = ((close - prev_close) / prev_close) * 100
+        
+        return {
+            "ticker": ticker,
+            "close": close,
+            "pct_change": pct_change,
+            "date": date.strftime('%Y-%m-%d'),
+            "timestamp": self.run_timestamp()
+        }
+    
     def fetch_historical_crypto_data(self, coin_id: str, date: datetime) -> Optional[Dict[str, Any]]:
         """Fetch historical cryptocurrency data for a specific date"""
         try:
@@ -121,10 +211,11 @@ class HistoricalETL:
             
             for attempt in range(self.max_retries):
                 try:
-                    response = requests.get(url, params=params, headers=self.request_headers, timeout=30)
+                    self.wait_for_coingecko()
+                    response = self.session.get(url, params=params, timeout=30)
                     response.raise_for_status()
                     
-                    data = response.json()
+                    data = orjson.loads(response.content)
                     
                     if 'market_data' not in data or not data['market_data']:
                         logger.warning(f"No historical crypto data found for {coin_id} on {date_str}")
@@ -143,7 +234,7 @@ class HistoricalETL:
                         "pct_change": 0,  # We'll calculate this separately with weekly data
                         "market_cap": market_data.get('market_cap', {}).get('usd', 0),
                         "date": date.strftime('%Y-%m-%d'),
-                        "timestamp": datetime.now().isoformat()
+                        "timestamp": self.run_timestamp()
                     }
                     
                 except requests.exceptions.HTTPError as e:
@@ -168,6 +259,34 @@ class HistoricalETL:
             logger.error(f"Unexpected error fetching historical crypto data for {coin_id}: {e}")
             return None
     
+    def wait_for_coingecko(self) -> None:
+        """Block only when another CoinGecko call would exceed the per-minute limit"""
+        with self._coingecko_lock:
+            if len(self._coingecko_calls) == self._coingecko_calls.maxlen:
+                wait = 60 - (time.monotonic() - self._coingecko_calls[0])
+                if wait > 0:
+                    time.sleep(wait)
+            
+            self._coingecko_calls.append(time.monotonic())
+    
+    def fetch_paced_crypto_data(self, coin_id: str, date: datetime) -> Optional[Dict[str, Any]]:
+        """Fetch historical crypto data from the disk cache, or from CoinGecko within the rate limit"""
+        cache_key = f"{coin_id}_{date.strftime('%Y-%m-%d')}"
+        # Today's snapshot may still move, so only completed days are cached
+        cacheable = self.use_cache and date.date() < datetime.now().date()
+        
+        if cacheable:
+            cached = self.crypto_history_cache.get(cache_key)
+            if cached is not None:
+                return cached
+        
+        crypto_data = self.fetch_historical_crypto_data(coin_id, date)
+        
+        if crypto_data and cacheable:
+            self.crypto_history_cache.set(cache_key, crypto_data)
+        
+        return crypto_data
+    
     def calculate_weekly_changes(self, historical_data: List[Dict]) -> List[Dict]:
         """Calculate week-over-week percentage changes"""
         if len(historical_data) < 2:
@@ -179,12 +298,13 @@ class HistoricalETL:
         for i in range(1, len(sorted_data)):
             current_week = sorted_data[i]
             prev_week = sorted_data[i-1]
+            prev_by_ticker = {c['ticker']: c for c in prev_week['data']}
             
             for company in current_week['data']:
                 ticker = company['ticker']
                 
                 # Find corresponding company in previous week
-                prev_company = next((c for c in prev_week['data'] if c['ticker'] == ticker), None)
+                prev_company = prev_by_ticker.get(ticker)
                 
                 if prev_company:
                     # Calculate stock price change
@@ -203,65 +323,85 @@ class HistoricalETL:
         mondays = self.get_past_mondays(8)  # Past 8 weeks (2 months)
         
         historical_weeks = []
+        run_started_at = self._run_started_at = datetime.now().isoformat()
         
         logger.info(f"Collecting historical data for {len(mondays)} Monday baselines...")
         
-        for monday in mondays:
-            week_end = monday.strftime('%Y-%m-%d')
-            logger.info(f"Processing week ending {week_end}...")
+        coin_ids = sorted({holding_info['coin_id'] for holding_info in holdings.values()})
+        
+        # Every lookup is network-bound, so the rate-limited CoinGecko requests run on their
+        # own pool while the stock history downloads alongside them
+        with ThreadPoolExecutor(max_workers=self.stock_workers) as stock_pool, \
+                ThreadPoolExecutor(max_workers=self.crypto_workers) as crypto_pool:
+            crypto_futures = {
+                (monday, coin_id): crypto_pool.submit(self.fetch_paced_crypto_data, coin_id, monday)
+                for monday in mondays
+                for coin_id in coin_ids
+            }
+            
+            # One download covers every ticker and week; closes are sliced out locally
+            bulk_history = self.fetch_bulk_stock_history(
+                list(holdings), min(mondays) - timedelta(days=5), max(mondays) + timedelta(days=1)
+            )
             
-            processed_data = []
-            crypto_cache = {}  # Cache to avoid duplicate API calls
+            stock_results = {}
+            stock_futures = {}
+            for monday in mondays:
+                for ticker in holdings:
+                    stock_data = self.pick_stock_close(bulk_history, ticker, monday)
+                    if stock_data:
+                        stock_results[(monday, ticker)] = stock_data
+                    else:
+                        # Fall back to a per-ticker lookup for anything the bulk download missed
+                        stock_futures[(monday, ticker)] = stock_pool.submit(
+                            self.fetch_historical_stock_data, ticker, monday, monday
+                        )
             
-            for ticker, holding_info in holdings.items():
-                logger.info(f"  Processing {ticker}...")
+            for monday in mondays:
+                week_end = monday.strftime('%Y-%m-%d')
+                logger.info(f"Processing week ending {week_end}...")
                 
-                # Fetch historical stock data
-                stock_data = self.fetch_historical_stock_data(ticker, monday, monday)
-                if not stock_data:
-                    logger.warning(f"  Skipping {ticker} - no stock data")
-                    continue
+                processed_data = []
                 
-                # Fetch historical crypto data (use cache if available)
-                coin_id = holding_info['coin_id']
-                if coin_id not in crypto_cache:
-                    crypto_data = self.fetch_historical_crypto_data(coin_id, monday)
-                    if crypto_data:
-                        crypto_cache[coin_id] = crypto_data
-                    else:
+                for ticker, holding_info in holdings.items():
+                    logger.info(f"  Processing {ticker}...")
+                    
+                    stock_data = stock_results.get((monday, ticker)) or stock_futures[(monday, ticker)].result()
+                    if not stock_data:
+                        logger.warning(f"  Skipping {ticker} - no stock data")
+                        continue
+                    
+                    coin_id = holding_info['coin_id']
+                    crypto_data = crypto_futures[(monday, coin_id)].result()
+                    if not crypto_data:
                         logger.warning(f"  Skipping {ticker} - no crypto data for {coin_id}")
                         continue
+                    
+                    # Combine data
+                    combined_data = {
+                        "ticker": ticker,
+                        "company_name": holding_info['company_name'],
+                        "stock_close": round(stock_data['close'], 2),
+                        "stock_pct_change": 0,  # Will be calculated later
+                        "coin": holding_info['coin'],
+                        "coin_close": round(crypto_data['close'], 2),
+                        "coin_pct_change": 0,   # Will be calculated later
+                        "holding_qty": holding_info['holding_qty'],
+                        "holding_pct_of_supply": 0,  # Not needed for baseline comparison
+                        "market_cap": crypto_data.get('market_cap', 0)
+                    }
+                    
+                    processed_data.append(combined_data)
                 
-                crypto_data = crypto_cache[coin_id]
-                
-                # Combine data
-                combined_data = {
-                    "ticker": ticker,
-                    "company_name": holding_info['company_name'],
-                    "stock_close": round(stock_data['close'], 2),
-                    "stock_pct_change": 0,  # Will be calculated later
-                    "coin": holding_info['coin'],
-                    "coin_close": round(crypto_data['close'], 2),
-                    "coin_pct_change": 0,   # Will be calculated later
-                    "holding_qty": holding_info['holding_qty'],
-                    "holding_pct_of_supply": 0,  # Not needed for baseline comparison
-                    "market_cap": crypto_data.get('market_cap', 0)
-                }
-                
-                processed_data.append(combined_data)
+                if processed_data:
+                    week_data = {
+                        "week_end": week_end,
+                        "generated_at": run_started_at,
+                        "data": processed_data
+                    }
+                    historical_weeks.append(week_data)
                 
-                # Rate limiting
-                time.sleep(self.rate_limit_delay)
-            
-            if processed_data:
-                week_data = {
-                    "week_end": week_end,
-                    "generated_at": datetime.now().isoformat(),
-                    "data": processed_data
-                }
-                historical_weeks.append(week_data)
-            
-            logger.info(f"  Completed {week_end} with {len(processed_data)} companies")
+                logger.info(f"  Completed {week_end} with {len(processed_data)} companies")
         
         # Calculate weekly changes
         historical_weeks = self.calculate_weekly_changes(historical_weeks)
@@ -272,17 +412,24 @@ class HistoricalETL:
         """Save historical baseline data"""
         output_file = self.data_dir / "historical_baseline.json"
         
-        with open(output_file, 'w') as f:
-            json.dump({
-                "collection_date": datetime.now().isoformat(),
-                "baseline_info": "Monday 8:00 AM UTC+8 baseline data",
-                "weeks_collected": len(historical_data),
-                "data": historical_data
-            }, f, indent=2, ensure_ascii=False)
+        payload = {
+            "collection_date": datetime.now().isoformat(),
+            "baseline_info": "Monday 8:00 AM UTC+8 baseline data",
+            "weeks_collected": len(historical_data),
+            "data": historical_data
+        }
+        
+        # Serialize once and write the whole document in a single call
+        with open(output_file, 'wb') as f:
+            f.write(orjson.dumps(payload, option=orjson.OPT_INDENT_2))
         
         logger.info(f"Historical data saved to {output_file}")
         logger.info(f"Collected {len(historical_data)} weeks of baseline data")
     
+    def close(self) -> None:
+        """Release pooled HTTP connections"""
+        self.session.close()
+    
     def run(self) -> None:
         """Execute the historical data collection"""
         logger.info("Starting historical baseline data collection...")
@@ -301,6 +448,8 @@ class HistoricalETL:
         except Exception as e:
             logger.error(f"Historical data collection failed: {e}")
             raise
+        finally:
+            self.close()
 
 def main():
     """Main entry point"""
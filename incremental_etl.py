@@ -6,11 +6,13 @@ Incremental ETL Pipeline for historical data management
 - Implements smart data persistence and incremental updates
 """
 
-import json
+import os
 import logging
 from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Dict, List, Any, Optional
+from concurrent.futures import ThreadPoolExecutor
+import orjson
 from etl import CryptoStockETL
 
 # Configure logging
@@ -23,12 +25,18 @@ class IncrementalETL:
         self.base_dir = Path(__file__).parent
         self.data_dir = self.base_dir / "public" / "data"
         self.historical_file = self.data_dir / "complete_historical_baseline.json"
+        self.stock_workers = 8  # Concurrent Yahoo Finance requests
         
+    @staticmethod
+    def _week_key(dt: datetime) -> str:
+        """ISO week key used to index the historical data, e.g. 2025-W32"""
+        year, week, _ = dt.isocalendar()
+        return f"{year}-W{week:02d}"
+    
     def load_existing_data(self) -> Dict[str, Any]:
         """Load existing historical data if available"""
         if self.historical_file.exists():
-            with open(self.historical_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            return orjson.loads(self.historical_file.read_bytes())
         
         # Return empty structure if no data exists
         return {
@@ -43,22 +51,15 @@ class IncrementalETL:
         """Determine which Friday dates we need to collect data for"""
         existing_weeks = set(existing_data.get("data", {}).keys())
         
-        # Get the last N Friday dates
-        target_fridays = []
+        # Get the last N Friday dates, generated oldest first for logical collection order
         last_friday = self.etl.get_last_friday_close()
+        fridays = [last_friday - timedelta(weeks=week_offset) for week_offset in range(weeks_to_collect - 1, -1, -1)]
         
-        for week_offset in range(weeks_to_collect):
-            friday = last_friday - timedelta(weeks=week_offset)
-            year, week, _ = friday.isocalendar()
-            week_key = f"{year}-W{week:02d}"
-            
-            # Only add if we don't already have this week's data
-            if week_key not in existing_weeks:
-                target_fridays.append(friday)
+        if not existing_weeks:
+            return fridays
         
-        # Sort oldest first for logical collection order
-        target_fridays.sort()
-        return target_fridays
+        # Only keep weeks we don't already have data for
+        return [friday for friday in fridays if self._week_key(friday) not in existing_weeks]
     
     def update_historical_data(self, weeks_to_collect: int = 10) -> bool:
         """Update historical data incrementally"""
@@ -85,61 +86,83 @@ class IncrementalETL:
         # Collect new data for missing weeks
         new_data_collected = 0
         
-        for friday in missing_fridays:
-            year, week, _ = friday.isocalendar()
-            week_key = f"{year}-W{week:02d}"
-            
-            logger.info(f"\nCollecting data for {week_key} ({friday.strftime('%Y-%m-%d')})...")
-            
-            companies = {}
-            all_data_collected = True
-            
-            # Get real stock and crypto prices for this specific Friday
-            for ticker, holding_info in holdings.items():
-                logger.info(f"  Processing {ticker}...")
+        # Stock lookups overlap freely; CoinGecko calls stay on a single worker so the
+        # ETL's built-in rate-limit spacing between them still holds
+        with ThreadPoolExecutor(max_workers=self.stock_workers) as stock_pool, \
+                ThreadPoolExecutor(max_workers=1) as crypto_pool:
+            for friday in missing_fridays:
+                week_key = self._week_key(friday)
                 
-                try:
-                    # Get stock price for this specific Friday
-                    stock_data = self.etl.fetch_stock_data(ticker, friday)
-                    if not stock_data:
-                        logger.warning(f"  Failed to get stock data for {ticker}")
-                        all_data_collected = False
-                        break
+                logger.info(f"\nCollecting data for {week_key} ({friday.strftime('%Y-%m-%d')})...")
+                
+                companies = {}
+                all_data_collected = True
+                
+                # Start every lookup for this specific Friday up front; tickers sharing a coin share one request
+                coin_futures = {
+                    coin_id: crypto_pool.submit(self.etl.fetch_crypto_data, coin_id, friday)
+                    for coin_id in dict.fromkeys(holding_info['coin_id'] for holding_info in holdings.values())
+                }
+                fetches = {
+                    ticker: (
+                        stock_pool.submit(self.etl.fetch_stock_data, ticker, friday),
+                        coin_futures[holding_info['coin_id']]
+                    )
+                    for ticker, holding_info in holdings.items()
+                }
+                
+                for ticker, holding_info in holdings.items():
+                    logger.info(f"  Processing {ticker}...")
+                    stock_future, crypto_future = fetches[ticker]
                     
-                    # Get crypto price for this specific Friday
-                    crypto_data = self.etl.fetch_crypto_data(holding_info['coin_id'], friday)
-                    if not crypto_data:
-                        logger.warning(f"  Failed to get crypto data for {holding_info['coin_id']}")
+                    try:
+                        # Get stock price for this specific Friday
+                        stock_data = stock_future.result()
+                        if not stock_data:
+                            logger.warning(f"  Failed to get stock data for {ticker}")
+                            all_data_collected = False
+                            break
+                        
+                        # Get crypto price for this specific Friday
+                        crypto_data = crypto_future.result()
+                        if not crypto_data:
+                            logger.warning(f"  Failed to get crypto data for {holding_info['coin_id']}")
+                            all_data_collected = False
+                            break
+                        
+                        companies[ticker] = {
+                            "company_name": holding_info.get('company_name', f"{ticker} Inc."),
+                            "ticker_used": ticker,
+                            "stock_price": stock_data['close'],
+                            "coin": holding_info['coin'],
+                            "coin_price": crypto_data['close'],
+                            "coin_id": holding_info['coin_id']
+                        }
+                        
+                        logger.info(f"    ✅ {ticker}: ${stock_data['close']:.2f}, {holding_info['coin']}: ${crypto_data['close']:.2f}")
+                        
+                    except Exception as e:
+                        logger.error(f"  Error processing {ticker}: {e}")
                         all_data_collected = False
                         break
-                    
-                    companies[ticker] = {
-                        "company_name": holding_info.get('company_name', f"{ticker} Inc."),
-                        "ticker_used": ticker,
-                        "stock_price": stock_data['close'],
-                        "coin": holding_info['coin'],
-                        "coin_price": crypto_data['close'],
-                        "coin_id": holding_info['coin_id']
+                
+                if not all_data_collected:
+                    # The week will be skipped, so drop lookups that have not started yet
+                    for futures in fetches.values():
+                        for future in futures:
+                            future.cancel()
+                
+                # Only add week if we got complete data
+                if all_data_collected and len(companies) == len(holdings):
+                    historical_data["data"][week_key] = {
+                        "baseline_date": friday.strftime('%Y-%m-%d'),
+                        "week_start": f"{friday.strftime('%Y-%m-%d')}T16:00:00-04:00",  # Market close time
+                        "companies": companies
                     }
-                    
-                    logger.info(f"    ✅ {ticker}: ${stock_data['close']:.2f}, {holding_info['coin']}: ${crypto_data['close']:.2f}")
-                    
-                except Exception as e:
-                    logger.error(f"  Error processing {ticker}: {e}")
-                    all_data_collected = False
-                    break
-            
-            # Only add week if we got complete data
-            if all_data_collected and len(companies) == len(holdings):
-                historical_data["data"][week_key] = {
-                    "baseline_date": friday.strftime('%Y-%m-%d'),
-                    "week_start": f"{friday.strftime('%Y-%m-%d')}T16:00:00-04:00",  # Market close time
-                    "companies": companies
-                }
-                new_data_collected += 1
-                logger.info(f"  ✅ Successfully collected data for {week_key}")
-            else:
-                logger.warning(f"  ❌ Incomplete data for {week_key}, skipping")
+                    new_data_collected += 1
+                    logger.info(f"  ✅ Successfully collected data for {week_key}")
+                else:
+                    logger.warning(f"  ❌ Incomplete data for {week_key}, skipping")
         
         # Update metadata
         if new_data_collected > 0:
@@ -151,9 +174,14 @@ class IncrementalETL:
                 all_dates.sort()
                 historical_data["period"] = f"{all_dates[0]} - {all_dates[-1]}"
             
-            # Save updated data
-            with open(self.historical_file, 'w', encoding='utf-8') as f:
-                json.dump(historical_data, f, indent=2, ensure_ascii=False)
+            # Save updated data to a temp file, then swap it in so a crash never leaves a half-written baseline.
+            # The file only ever grows and is read by code, so it is stored compact rather than indented.
+            tmp_file = self.historical_file.with_suffix('.json.tmp')
+            with open(tmp_file, 'wb') as f:
+                f.write(orjson.dumps(historical_data))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_file, self.historical_file)
             
             logger.info(f"\n🎉 Successfully added {new_data_collected} new weeks of data")
             logger.info(f"Total weeks in database: {len(historical_data['data'])}")
@@ -165,9 +193,7 @@ class IncrementalETL:
     
     def get_latest_week_for_current_etl(self) -> Optional[str]:
         """Get the most recent Friday that should be used for current weekly ETL"""
-        last_friday = self.etl.get_last_friday_close()
-        year, week, _ = last_friday.isocalendar()
-        return f"{year}-W{week:02d}"
+        return self._week_key(self.etl.get_last_friday_close())
     
     def ensure_current_week_exists(self) -> bool:
         """Ensure we have data for the current week (for weekly ETL integration)"""
@@ -1,10 +1,15 @@
 #!/usr/bin/env python3
 
 import json
+import requests
 import yfinance as yf
 from datetime import datetime
 from pathlib import Path
 
+# 所有公司共用一個連線池
+session = requests.Session()
+session.headers['User-Agent'] = 'crypto-stock-tracker-validate/1.0'
+
 def validate_new_companies():
     """快速驗證新添加的公司"""
     
@@ -16,11 +21,21 @@ def validate_new_companies():
         "CEP": "XXI Century Capital Corp"
     }
     
+    # 一次批量下載所有公司最近5日的歷史數據
+    try:
+        history = yf.download(
+            list(new_companies), period="5d", group_by='ticker',
+            threads=True, progress=False, session=session
+        )
+    except Exception as e:
+        print(f"⚠ 批量下載歷史數據失敗，改為逐一下載: {e}")
+        history = None
+    
     for ticker, company_name in new_companies.items():
         print(f"\n驗證 {ticker} ({company_name})...")
         
         try:
-            stock = yf.Ticker(ticker)
+            stock = yf.Ticker(ticker, session=session)
             info = stock.info
             
             if info and 'symbol' in info:
@@ -34,7 +49,10 @@ def validate_new_companies():
                     print(f"  ✓ 市值: ${market_cap:,}")
                 
                 # 獲取最近的歷史數據
-                hist = stock.history(period="5d")
+                if history is not None and ticker in history.columns.get_level_values(0):
+                    hist = history[ticker].dropna(how='all')
+                else:
+                    hist = stock.history(period="5d")
                 if not hist.empty:
                     print(f"  ✓ 可獲取歷史數據")
                     print(f"  ✓ 最近5日平均成交量: {hist['Volume'].mean():,.0f}")
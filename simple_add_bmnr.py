@@ -1,6 +1,10 @@
-import json
+import os
+import orjson
 import yfinance as yf
 from datetime import datetime
+from pathlib import Path
+
+data_file = Path('public/data/complete_historical_baseline.json')
 
 # 獲取 BMNR 最新股價
 ticker = yf.Ticker('BMNR')
@@ -10,8 +14,7 @@ current_price = info.get('regularMarketPrice', info.get('currentPrice', 54.87))
 print(f'BMNR current price: ${current_price}')
 
 # 讀取歷史數據文件
-with open('public/data/complete_historical_baseline.json', 'r') as f:
-    data = json.load(f)
+data = orjson.loads(data_file.read_bytes())
 
 # 為每個週期添加 BMNR 數據
 week_prices = {
@@ -26,12 +29,14 @@ updated_count = 0
 
 for week_key, price in week_prices.items():
     if week_key in data['data']:
+        companies = data['data'][week_key]['companies']
+        
         # 獲取該週的 ETH 價格（從 SBET 公司）
-        sbet_data = data['data'][week_key]['companies'].get('SBET', {})
+        sbet_data = companies.get('SBET', {})
         eth_price = sbet_data.get('coin_price', 3500)  # 預設 ETH 價格
         
         # 新增 BMNR 數據
-        data['data'][week_key]['companies']['BMNR'] = {
+        companies['BMNR'] = {
             "company_name": "Bitmine Immersion Technologies Inc",
             "ticker_used": "BMNR",
             "stock_price": price,
@@ -43,8 +48,9 @@ for week_key, price in week_prices.items():
         print(f'Added BMNR to {week_key}: ${price}')
         updated_count += 1
 
-# 保存更新後的數據
-with open('public/data/complete_historical_baseline.json', 'w') as f:
-    json.dump(data, f, indent=2, ensure_ascii=False)
+# 保存更新後的數據：先寫入暫存檔再原子替換，避免中途失敗損壞原檔
+tmp_file = data_file.with_suffix('.json.tmp')
+tmp_file.write_bytes(orjson.dumps(data))
+os.replace(tmp_file, data_file)
 
 print(f'Updated {updated_count} weeks of BMNR data')
\ No newline at end of file
@@ -1,12 +1,17 @@
+import requests
 import yfinance as yf
 
+# 所有公司共用一個連線池
+session = requests.Session()
+session.headers['User-Agent'] = 'crypto-stock-tracker-validate/1.0'
+
 # 驗證新公司
 companies = {"MARA": "MARA Holdings", "CEP": "XXI Century Capital"}
 
 for ticker, name in companies.items():
     print(f"\n--- {ticker} ({name}) ---")
     try:
-        stock = yf.Ticker(ticker)
+        stock = yf.Ticker(ticker, session=session)
         info = stock.info
         
         if info and 'symbol' in info:
@@ -6,6 +6,7 @@ Test synchronized timing for stock and crypto data
 from etl import CryptoStockETL
 import logging
 import json
+from concurrent.futures import ThreadPoolExecutor
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -21,14 +22,16 @@ def test_synchronized_data():
     # Test VERB + TON combination
     logger.info("=== Testing VERB vs TON ===")
     
-    # Get VERB stock data
-    verb_stock = etl.fetch_stock_data('VERB', target_date)
+    # Get VERB stock data and TON crypto data at the same time; they come from different APIs
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        stock_future = executor.submit(etl.fetch_stock_data, 'VERB', target_date)
+        crypto_future = executor.submit(etl.fetch_crypto_data, 'the-open-network', target_date)
+        verb_stock, ton_crypto = stock_future.result(), crypto_future.result()
+    
     if not verb_stock:
         logger.error("Failed to get VERB stock data")
         return
     
-    # Get TON crypto data  
-    ton_crypto = etl.fetch_crypto_data('the-open-network', target_date)
     if not ton_crypto:
         logger.error("Failed to get TON crypto data")
         return
@@ -69,8 +72,8 @@ def test_synchronized_data():
     }
     
     # Save test results
-    with open('public/data/synchronized_test.json', 'w') as f:
-        json.dump(test_data, f, indent=2, ensure_ascii=False)
+    with open('public/data/synchronized_test.json', 'wb') as f:
+        f.write(json.dumps(test_data, indent=2, separators=(',', ': '), ensure_ascii=False).encode('utf-8'))
     
     logger.info("Synchronized test data saved to public/data/synchronized_test.json")
     
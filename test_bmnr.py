@@ -1,23 +1,26 @@
 #!/usr/bin/env python3
 
+import requests
 import yfinance as yf
 from datetime import datetime, timedelta
 
+# 所有 Yahoo Finance 請求共用一個連線池
+SESSION = requests.Session()
+SESSION.headers.update({'User-Agent': 'crypto-stock-tracker/1.0 (https://github.com/user/crypto-stock-tracker)'})
+
 print('正在驗證 BMNR 股票代碼...')
 
 # 獲取 BMNR 股票數據
-ticker = yf.Ticker('BMNR')
+ticker = yf.Ticker('BMNR', session=SESSION)
 
 try:
-    # 獲取公司基本資訊
-    info = ticker.info
-    print(f'公司名稱: {info.get("longName", info.get("shortName", "N/A"))}')
-    print(f'當前價格: ${info.get("currentPrice", info.get("regularMarketPrice", "N/A"))}')
-    print(f'交易所: {info.get("exchange", "N/A")}')
-    print(f'貨幣: {info.get("currency", "N/A")}')
-    print(f'行業: {info.get("industry", "N/A")}')
+    # 價格與市值走 fast_info 的輕量端點，不觸發完整的 info 抓取
+    fi = ticker.fast_info
+    print(f'當前價格: ${fi.last_price}')
+    print(f'交易所: {fi.exchange}')
+    print(f'貨幣: {fi.currency}')
     
-    market_cap = info.get("marketCap", "N/A")
+    market_cap = fi.market_cap or "N/A"
     if market_cap != "N/A" and isinstance(market_cap, (int, float)):
         market_cap_str = f"${market_cap:,.0f}"
     else:
@@ -50,6 +53,14 @@ try:
 except Exception as e:
     print(f'獲取數據時出錯: {e}')
 
+# 公司名稱與行業只有 info 提供，放在最後才抓取
+try:
+    info = ticker.info
+    print(f'\n公司名稱: {info.get("longName", info.get("shortName", "N/A"))}')
+    print(f'行業: {info.get("industry", "N/A")}')
+except Exception as e:
+    print(f'獲取公司資訊時出錯: {e}')
+
 # 檢查是否適合作為 ETH 生態的公司
 print(f'\n分析結果:')
 if 'info' in locals() and info:
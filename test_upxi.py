@@ -1,12 +1,17 @@
 #!/usr/bin/env python3
 
+import requests
 import yfinance as yf
 from datetime import datetime, timedelta
 
+# 所有 Yahoo Finance 請求共用一個連線池
+SESSION = requests.Session()
+SESSION.headers.update({'User-Agent': 'crypto-stock-tracker/1.0 (https://github.com/user/crypto-stock-tracker)'})
+
 print('正在獲取 UPXI 的最新股價數據...')
 
 # 獲取 UPXI 股票數據
-ticker = yf.Ticker('UPXI')
+ticker = yf.Ticker('UPXI', session=SESSION)
 
 # 獲取最近7天的數據
 end_date = datetime.now()
@@ -26,13 +31,19 @@ if not hist.empty:
 else:
     print('無法獲取 UPXI 歷史數據')
 
-# 獲取公司資訊
+# 價格統計走 fast_info 的輕量端點，不觸發完整的 info 抓取
+try:
+    fi = ticker.fast_info
+    print(f'\n當前價格: ${fi.last_price}')
+    print(f'前一日收盤: ${fi.previous_close}')
+    print(f'52週高點: ${fi.year_high}')
+    print(f'52週低點: ${fi.year_low}')
+except Exception as e:
+    print(f'獲取價格資訊時出錯: {e}')
+
+# 公司名稱只有 info 提供，放在最後才抓取
 try:
     info = ticker.info
-    print(f'\n公司名稱: {info.get("longName", "N/A")}')
-    print(f'當前價格: ${info.get("currentPrice", "N/A")}')
-    print(f'前一日收盤: ${info.get("previousClose", "N/A")}')
-    print(f'52週高點: ${info.get("fiftyTwoWeekHigh", "N/A")}')
-    print(f'52週低點: ${info.get("fiftyTwoWeekLow", "N/A")}')
+    print(f'公司名稱: {info.get("longName", "N/A")}')
 except Exception as e:
     print(f'獲取公司資訊時出錯: {e}')
\ No newline at end of file
@@ -1,17 +1,24 @@
 #!/usr/bin/env python3
 
-import json
+import os
+import orjson
+import pandas as pd
+import requests
 import yfinance as yf
 from datetime import datetime, timedelta
 from pathlib import Path
 
+# 所有 Yahoo Finance 請求共用一個連線池
+SESSION = requests.Session()
+SESSION.headers.update({'User-Agent': 'crypto-stock-tracker/1.0 (https://github.com/user/crypto-stock-tracker)'})
+
 def update_bmnr_historical_data():
     """更新 BMNR 的歷史數據到基準文件中"""
     
     print("開始為 BMNR 獲取歷史股價數據...")
     
     # 獲取 BMNR 股價數據
-    ticker = yf.Ticker('BMNR')
+    ticker = yf.Ticker('BMNR', session=SESSION)
     
     # 獲取最近8週的數據
     end_date = datetime.now()
@@ -34,8 +41,7 @@ def update_bmnr_historical_data():
         print(f"❌ 數據文件不存在: {data_file}")
         return False
         
-    with open(data_file, 'r', encoding='utf-8') as f:
-        data = json.load(f)
+    data = orjson.loads(data_file.read_bytes())
     
     # 定義週期到實際日期的映射
     week_dates = {
@@ -48,30 +54,25 @@ def update_bmnr_historical_data():
     
     updated_weeks = 0
     
-    for week_key, week_info in data['data'].items():
-        if week_key not in week_dates:
+    # 一次向量化找出每個週期最接近日期的收盤價
+    closes = pd.Series(hist['Close'].to_numpy(), index=hist.index.tz_localize(None).normalize())
+    closest_prices = dict(zip(
+        week_dates,
+        closes.reindex(pd.to_datetime(list(week_dates.values())), method='nearest')
+    ))
+    
+    # 只走訪有對應日期的週期，不必掃過整份歷史數據
+    for week_key, target_date_str in week_dates.items():
+        week_info = data['data'].get(week_key)
+        if week_info is None:
             continue
-            
-        target_date_str = week_dates[week_key]
         
         try:
-            target_date = datetime.strptime(target_date_str, '%Y-%m-%d')
-            
-            # 在歷史數據中找到最接近的日期
-            closest_date = None
-            closest_price = None
-            min_diff = float('inf')
-            
-            for date, row in hist.iterrows():
-                date_diff = abs((date.to_pydatetime().date() - target_date.date()).days)
-                if date_diff < min_diff:
-                    min_diff = date_diff
-                    closest_date = date
-                    closest_price = row['Close']
+            closest_price = closest_prices[week_key]
             
-            if closest_price is not None:
+            if pd.notna(closest_price):
                 # 新增 BMNR 到該週的數據
-                data['data'][week_key]['companies']['BMNR'] = {
+                week_info['companies']['BMNR'] = {
                     "company_name": "Bitmine Immersion Technologies Inc",
                     "ticker_used": "BMNR",
                     "stock_price": round(closest_price, 2),
@@ -88,8 +89,10 @@ def update_bmnr_historical_data():
     
     if updated_weeks > 0:
         # 保存更新後的數據
-        with open(data_file, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+        # 與其他寫入者一致，以緊湊格式輸出；先寫入暫存檔再原子替換，避免中途失敗損壞原檔
+        tmp_file = data_file.with_suffix('.json.tmp')
+        tmp_file.write_bytes(orjson.dumps(data))
+        os.replace(tmp_file, data_file)
         
         print(f"\n✅ 成功更新了 {updated_weeks} 個週期的 BMNR 數據")
         print("📄 數據已保存到 complete_historical_baseline.json")
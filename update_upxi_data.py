@@ -1,15 +1,22 @@
 #!/usr/bin/env python3
 
-import json
+import os
+import orjson
+import pandas as pd
+import requests
 import yfinance as yf
 from datetime import datetime, timedelta
 from pathlib import Path
 
+# 所有 Yahoo Finance 請求共用一個連線池
+SESSION = requests.Session()
+SESSION.headers.update({'User-Agent': 'crypto-stock-tracker/1.0 (https://github.com/user/crypto-stock-tracker)'})
+
 def update_upxi_data():
     """手動更新 UPXI 股價數據到歷史基準數據文件中"""
     
     # 獲取最新的 UPXI 股價
-    ticker = yf.Ticker('UPXI')
+    ticker = yf.Ticker('UPXI', session=SESSION)
     
     # 獲取最近8週的數據
     end_date = datetime.now()
@@ -32,8 +39,7 @@ def update_upxi_data():
         print(f"數據文件不存在: {data_file}")
         return
         
-    with open(data_file, 'r', encoding='utf-8') as f:
-        data = json.load(f)
+    data = orjson.loads(data_file.read_bytes())
     
     # 更新 UPXI 數據
     updated_weeks = 0
@@ -47,42 +53,38 @@ def update_upxi_data():
         "2025-W33": "2025-08-15"   # 8/15 週五
     }
     
-    for week_key, week_info in data['data'].items():
-        if 'UPXI' in week_info['companies']:
-            # 根據週期獲取對應的股價
-            target_date_str = week_dates.get(week_key)
-            if not target_date_str:
-                continue
-                
-            try:
-                target_date = datetime.strptime(target_date_str, '%Y-%m-%d')
-                
-                # 在歷史數據中找到最接近的日期
-                closest_date = None
-                closest_price = None
-                min_diff = float('inf')
-                
-                for date, row in hist.iterrows():
-                    date_diff = abs((date.to_pydatetime().date() - target_date.date()).days)
-                    if date_diff < min_diff:
-                        min_diff = date_diff
-                        closest_date = date
-                        closest_price = row['Close']
+    # 一次向量化找出每個週期最接近日期的收盤價
+    closes = pd.Series(hist['Close'].to_numpy(), index=hist.index.tz_localize(None).normalize())
+    closest_prices = dict(zip(
+        week_dates,
+        closes.reindex(pd.to_datetime(list(week_dates.values())), method='nearest')
+    ))
+    
+    # 只走訪有對應日期的週期，不必掃過整份歷史數據
+    for week_key, target_date_str in week_dates.items():
+        week_info = data['data'].get(week_key)
+        if week_info is None or 'UPXI' not in week_info['companies']:
+            continue
+            
+        try:
+            closest_price = closest_prices[week_key]
+            
+            if pd.notna(closest_price):
+                # 更新 UPXI 股價數據
+                week_info['companies']['UPXI']['stock_price'] = round(closest_price, 2)
+                print(f"更新 {week_key} ({target_date_str}): ${closest_price:.2f}")
+                updated_weeks += 1
                 
-                if closest_price is not None:
-                    # 更新 UPXI 股價數據
-                    data['data'][week_key]['companies']['UPXI']['stock_price'] = round(closest_price, 2)
-                    print(f"更新 {week_key} ({target_date_str}): ${closest_price:.2f}")
-                    updated_weeks += 1
-                    
-            except Exception as e:
-                print(f"處理 {week_key} 時出錯: {e}")
-                continue
+        except Exception as e:
+            print(f"處理 {week_key} 時出錯: {e}")
+            continue
     
     if updated_weeks > 0:
         # 保存更新後的數據
-        with open(data_file, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+        # 與其他寫入者一致，以緊湊格式輸出；先寫入暫存檔再原子替換，避免中途失敗損壞原檔
+        tmp_file = data_file.with_suffix('.json.tmp')
+        tmp_file.write_bytes(orjson.dumps(data))
+        os.replace(tmp_file, data_file)
         
         print(f"\n✅ 成功更新了 {updated_weeks} 個週期的 UPXI 數據")
         print("數據已保存到 complete_historical_baseline.json")
@@ -4,23 +4,41 @@
 只更新最新一週的數據，不重新處理歷史數據
 """
 
-import json
 import logging
+import orjson
 from datetime import datetime, timedelta
 from pathlib import Path
-from etl import CryptoStockETL
+from concurrent.futures import ThreadPoolExecutor
+from etl import CryptoStockETL, write_json_atomic
+from cache import FileCache
 
 # 配置日誌
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# 同一行程內的所有 WeeklyUpdate 共用一個 ETL（含 holdings 與連線池）
+_shared_etl = None
+
+def get_shared_etl():
+    """取得共用的 CryptoStockETL，首次呼叫時才建立"""
+    global _shared_etl
+    if _shared_etl is None:
+        _shared_etl = CryptoStockETL()
+    return _shared_etl
+
 class WeeklyUpdate:
     def __init__(self):
-        self.etl = CryptoStockETL()
+        self.etl = get_shared_etl()
+        self.session = self.etl.session  # 與 ETL 共用連線池
         self.base_dir = Path(__file__).parent
         self.data_dir = self.base_dir / "public" / "data"
         self.historical_file = self.data_dir / "complete_historical_baseline.json"
         
+        # 重跑時直接使用同一個週五已抓過的價格，6 小時後過期
+        self.stock_cache = FileCache("weekly_stock", ttl=6 * 3600)
+        self.crypto_cache = FileCache("weekly_crypto", ttl=6 * 3600)
+        self.stock_workers = 8  # 同時進行的 Yahoo Finance 請求數
+        
     def get_current_week_key(self):
         """取得本週的week key"""
         last_friday = self.etl.get_last_friday_close()
@@ -30,8 +48,7 @@ class WeeklyUpdate:
     def load_existing_data(self):
         """載入現有歷史數據"""
         if self.historical_file.exists():
-            with open(self.historical_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            return orjson.loads(self.historical_file.read_bytes())
         return {
             "generated_at": datetime.now().isoformat(),
             "timezone": "Asia/Taipei", 
@@ -40,6 +57,18 @@ class WeeklyUpdate:
             "data": {}
         }
         
+    def fetch_crypto_data_cached(self, coin_id, last_friday):
+        """獲取幣價數據，優先使用快取"""
+        cache_key = f"{coin_id}_{last_friday.strftime('%Y-%m-%d')}"
+        crypto_data = self.crypto_cache.get(cache_key)
+        
+        if crypto_data is None:
+            crypto_data = self.etl.fetch_crypto_data(coin_id, last_friday)
+            if crypto_data:
+                self.crypto_cache.set(cache_key, crypto_data)
+                
+        return crypto_data
+        
     def update_current_week_only(self):
         """只更新本週數據"""
         week_key, last_friday = self.get_current_week_key()
@@ -62,47 +91,84 @@ class WeeklyUpdate:
         companies = {}
         success_count = 0
         
-        for ticker, holding_info in holdings.items():
-            logger.info(f"處理 {ticker}...")
+        # 股價補抓可並行；CoinGecko 請求放在單一工作執行緒，維持 ETL 內建的限速間隔
+        with ThreadPoolExecutor(max_workers=self.stock_workers) as stock_pool, \
+                ThreadPoolExecutor(max_workers=1) as crypto_pool:
+            # 幣價請求先送出，與下方的股價下載同時進行；多家公司持有同一幣種時只抓一次
+            crypto_futures = {
+                coin_id: crypto_pool.submit(self.fetch_crypto_data_cached, coin_id, last_friday)
+                for coin_id in dict.fromkeys(h['coin_id'] for h in holdings.values())
+            }
             
-            try:
-                # 獲取股價數據
-                stock_data = self.etl.fetch_stock_data(ticker, last_friday)
-                if not stock_data:
-                    logger.warning(f"無法獲取 {ticker} 股價")
-                    continue
-                    
-                # 獲取幣價數據  
-                crypto_data = self.etl.fetch_crypto_data(holding_info['coin_id'], last_friday)
-                if not crypto_data:
-                    logger.warning(f"無法獲取 {holding_info['coin_id']} 幣價")
-                    continue
+            # 先讀快取，其餘公司一次批量下載股價，缺漏的再並行逐一補抓
+            friday_str = last_friday.strftime('%Y-%m-%d')
+            stock_results = {}
+            for ticker in holdings:
+                cached = self.stock_cache.get(f"{ticker}_{friday_str}")
+                if cached is not None:
+                    stock_results[ticker] = cached
                     
-                companies[ticker] = {
-                    "company_name": holding_info.get('company_name', f"{ticker} Inc."),
-                    "ticker_used": ticker,
-                    "stock_price": stock_data['close'],
-                    "coin": holding_info['coin'],
-                    "coin_price": crypto_data['close'],
-                    "coin_id": holding_info['coin_id']
-                }
+            uncached_tickers = [ticker for ticker in holdings if ticker not in stock_results]
+            if uncached_tickers:
+                stock_results.update(self.etl.fetch_stock_data_batch(uncached_tickers, last_friday))
                 
-                success_count += 1
-                logger.info(f"✅ {ticker}: ${stock_data['close']:.2f}, {holding_info['coin']}: ${crypto_data['close']:.2f}")
+            stock_futures = {
+                ticker: stock_pool.submit(self.etl.fetch_stock_data, ticker, last_friday)
+                for ticker in holdings
+                if ticker not in stock_results
+            }
+            
+            for ticker, holding_info in holdings.items():
+                logger.info(f"處理 {ticker}...")
                 
-            except Exception as e:
-                logger.error(f"處理 {ticker} 時出錯: {e}")
-                continue
+                try:
+                    # 獲取股價數據
+                    stock_data = stock_results[ticker] if ticker in stock_results else stock_futures[ticker].result()
+                    if not stock_data:
+                        logger.warning(f"無法獲取 {ticker} 股價")
+                        continue
+                    if ticker in uncached_tickers:
+                        self.stock_cache.set(f"{ticker}_{friday_str}", stock_data)
+                        
+                    # 獲取幣價數據  
+                    crypto_data = crypto_futures[holding_info['coin_id']].result()
+                    if not crypto_data:
+                        logger.warning(f"無法獲取 {holding_info['coin_id']} 幣價")
+                        continue
+                        
+                    companies[ticker] = {
+                        "company_name": holding_info.get('company_name', f"{ticker} Inc."),
+                        "ticker_used": ticker,
+                        "stock_price": stock_data['close'],
+                        "coin": holding_info['coin'],
+                        "coin_price": crypto_data['close'],
+                        "coin_id": holding_info['coin_id']
+                    }
+                    
+                    success_count += 1
+                    logger.info(f"✅ {ticker}: ${stock_data['close']:.2f}, {holding_info['coin']}: ${crypto_data['close']:.2f}")
+                    
+                except Exception as e:
+                    logger.error(f"處理 {ticker} 時出錯: {e}")
+                    continue
                 
         # 只有在獲得完整數據時才更新
         if success_count == len(holdings):
-            # 更新本週數據
-            historical_data["data"][week_key] = {
+            new_entry = {
                 "baseline_date": last_friday.strftime('%Y-%m-%d'),
                 "week_start": f"{last_friday.strftime('%Y-%m-%d')}T16:00:00-04:00",
                 "companies": companies
             }
             
+            # 同一天重跑且數據沒有變動時，不必重寫整份歷史檔案
+            if historical_data["data"].get(week_key) == new_entry:
+                logger.info(f"本週數據 {week_key} 沒有變動，略過寫入歷史檔案")
+                self.generate_weekly_stats_format(week_key, last_friday, companies, holdings)
+                return True
+                
+            # 更新本週數據
+            historical_data["data"][week_key] = new_entry
+            
             # 更新元數據
             historical_data["generated_at"] = datetime.now().isoformat()
             
@@ -113,8 +179,7 @@ class WeeklyUpdate:
                 historical_data["period"] = f"{all_dates[0]} - {all_dates[-1]}"
                 
             # 保存更新後的數據
-            with open(self.historical_file, 'w', encoding='utf-8') as f:
-                json.dump(historical_data, f, indent=2, ensure_ascii=False)
+            write_json_atomic(self.historical_file, historical_data)
                 
             # 🔥 CRITICAL: 生成前端需要的 weekly_stats.json 格式
             self.generate_weekly_stats_format(week_key, last_friday, companies, holdings)
@@ -164,8 +229,7 @@ class WeeklyUpdate:
         
         # 保存到前端數據文件
         weekly_file = self.data_dir / "weekly_stats.json"
-        with open(weekly_file, 'w', encoding='utf-8') as f:
-            json.dump(weekly_stats, f, indent=2, ensure_ascii=False)
+        write_json_atomic(weekly_file, weekly_stats)
             
         # 生成摘要文件
         summary = {
@@ -175,8 +239,7 @@ class WeeklyUpdate:
         }
         
         summary_file = self.data_dir / "summary.json"
-        with open(summary_file, 'w', encoding='utf-8') as f:
-            json.dump(summary, f, indent=2, ensure_ascii=False)
+        write_json_atomic(summary_file, summary)
             
         logger.info(f"✅ 生成前端數據文件: {weekly_file}")
         logger.info(f"✅ 生成摘要文件: {summary_file}")